@@ -2,7 +2,41 @@ from ethjsonrpc.client import (EthJsonRpc, ParityEthJsonRpc,
                                ETH_DEFAULT_RPC_PORT, GETH_DEFAULT_RPC_PORT,
                                PYETHAPP_DEFAULT_RPC_PORT)
 
-from ethjsonrpc.exceptions import (ConnectionError, BadStatusCodeError,
-                                   BadJsonError, BadResponseError)
+from ethjsonrpc.async_client import AsyncEthJsonRpc, AsyncParityEthJsonRpc
 
-from ethjsonrpc.utils import wei_to_ether, ether_to_wei
+from ethjsonrpc.multi import MultiEthJsonRpc, MultiParityEthJsonRpc
+
+from ethjsonrpc.socket_client import (WebSocketEthJsonRpc, WebSocketParityEthJsonRpc, IpcEthJsonRpc,
+                                      IpcParityEthJsonRpc, Subscription)
+
+from ethjsonrpc.abi import ContractFunction, get_function
+
+from ethjsonrpc.batch import Batch, BatchCall
+
+from ethjsonrpc.cache import ResponseCache, HeadCache
+
+from ethjsonrpc.models import Block, Transaction, Receipt, Log, Trace
+
+from ethjsonrpc.codec import JsonCodec, UjsonCodec, OrjsonCodec
+
+from ethjsonrpc.store import BlockStore
+
+from ethjsonrpc.limiter import RateLimiter, TokenBucket
+
+from ethjsonrpc.retry import RetryPolicy
+
+from ethjsonrpc.coalesce import SingleFlight
+
+from ethjsonrpc.poller import FilterPoller
+
+from ethjsonrpc.follower import ChainFollower, FileCheckpoint, FollowedBlock
+
+from ethjsonrpc.submitter import NonceManager, TxSubmitter, SubmittedTransaction
+from ethjsonrpc.receipts import ReceiptWaiter
+
+from ethjsonrpc.exceptions import (ConnectionError, TimeoutError, ConnectError, ConnectTimeoutError,
+                                   BadStatusCodeError, BadJsonError, BadResponseError)
+
+from ethjsonrpc.utils import (wei_to_ether, ether_to_wei, hex_to_dec_array, hex_to_uint64_array,
+                              clean_hex_array, convert_units, divmod_units, wei_to_ether_array,
+                              ether_to_wei_array, wei_to_gwei_array, gwei_to_wei_array)
@@ -0,0 +1,219 @@
+import threading
+
+from ethereum import utils
+from ethereum.abi import process_type, encode_single, decode_single
+
+
+class BaseType(object):
+    '''
+    Static 32-byte ABI type (uint<N>, int<N>, address, bool, bytes<N>, ...)
+    '''
+
+    dynamic = False
+    size = 32
+
+    def __init__(self, name):
+        self.name = name
+        self.typ = process_type(name)
+
+    def encode(self, value):
+        return encode_single(self.typ, value)
+
+    def decode(self, data, pos):
+        return decode_single(self.typ, data[pos:pos + 32])
+
+
+class BytesType(object):
+    '''
+    Dynamic bytes and string
+    '''
+
+    dynamic = True
+    size = 32
+
+    def __init__(self, name):
+        self.name = name
+
+    def encode(self, value):
+        value = utils.to_string(value)
+        padding = utils.ceil32(len(value)) - len(value)
+        return utils.zpad(utils.encode_int(len(value)), 32) + value + b'\x00' * padding
+
+    def decode(self, data, pos):
+        length = utils.big_endian_to_int(data[pos:pos + 32])
+        return data[pos + 32:pos + 32 + length]
+
+
+class TupleType(object):
+    '''
+    Tuple of ABI types, encoded with the head/tail mechanism. Function
+    arguments and return values are tuples as well.
+    '''
+
+    def __init__(self, components):
+        self.components = components
+        self.dynamic = any(c.dynamic for c in components)
+        self.head_size = sum(32 if c.dynamic else c.size for c in components)
+        self.size = 32 if self.dynamic else self.head_size
+
+    @property
+    def name(self):
+        return '({})'.format(','.join(c.name for c in self.components))
+
+    def encode(self, values):
+        values = list(values)
+        if len(values) != len(self.components):
+            raise ValueError('expected {} values, got {}'.format(len(self.components), len(values)))
+        head, tail = [], []
+        tail_size = 0
+        for c, value in zip(self.components, values):
+            encoded = c.encode(value)
+            if c.dynamic:
+                head.append(utils.zpad(utils.encode_int(self.head_size + tail_size), 32))
+                tail.append(encoded)
+                tail_size += len(encoded)
+            else:
+                head.append(encoded)
+        return b''.join(head + tail)
+
+    def decode(self, data, pos=0):
+        values = []
+        offset = pos
+        for c in self.components:
+            if c.dynamic:
+                start = pos + utils.big_endian_to_int(data[offset:offset + 32])
+                values.append(c.decode(data, start))
+                offset += 32
+            else:
+                values.append(c.decode(data, offset))
+                offset += c.size
+        return tuple(values)
+
+
+class ArrayType(object):
+    '''
+    Fixed-size (T[k]) or dynamic (T[]) array of an ABI type
+    '''
+
+    def __init__(self, element, length=None):
+        self.element = element
+        self.length = length
+        self.dynamic = length is None or element.dynamic
+        self.size = 32 if self.dynamic else length * element.size
+
+    @property
+    def name(self):
+        return '{}[{}]'.format(self.element.name, '' if self.length is None else self.length)
+
+    def _tuple(self, length):
+        return TupleType([self.element] * length)
+
+    def encode(self, values):
+        values = list(values)
+        if self.length is None:
+            return utils.zpad(utils.encode_int(len(values)), 32) + self._tuple(len(values)).encode(values)
+        return self._tuple(self.length).encode(values)
+
+    def decode(self, data, pos):
+        if self.length is None:
+            length = utils.big_endian_to_int(data[pos:pos + 32])
+            return list(self._tuple(length).decode(data, pos + 32))
+        return list(self._tuple(self.length).decode(data, pos))
+
+
+def split_types(types):
+    '''
+    Split a comma-separated list of types, keeping tuple types such as
+    "(address,uint256)[]" in one piece
+    '''
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(types):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(types[start:i].strip())
+            start = i + 1
+    if depth != 0:
+        raise ValueError('unbalanced parentheses in {!r}'.format(types))
+    last = types[start:].strip()
+    if last or parts:
+        parts.append(last)
+    return parts
+
+
+def parse_type(name):
+    '''
+    Parse a type string into a type object
+    '''
+    name = name.strip()
+    if name.endswith(']'):
+        start = name.rindex('[')
+        length = name[start + 1:-1]
+        return ArrayType(parse_type(name[:start]), int(length) if length else None)
+    if name.startswith('('):
+        return TupleType([parse_type(t) for t in split_types(name[1:-1])])
+    if name in ('bytes', 'string'):
+        return BytesType(name)
+    return BaseType(name)
+
+
+def parse_signature(signature):
+    '''
+    Split a function signature like "transfer(address,uint256)" into its
+    name and list of argument types
+    '''
+    if signature.find('(') == -1 or not signature.endswith(')'):
+        raise RuntimeError('Invalid function signature. Missing "(" and/or ")"...')
+    start = signature.index('(')
+    return signature[:start], split_types(signature[start + 1:-1])
+
+
+class ContractFunction(object):
+    '''
+    Contract function with its selector and argument and result codecs
+    computed once, so encoding a call and decoding its result do no hashing
+    or type parsing
+    '''
+
+    def __init__(self, signature, result_types=None):
+        self.signature = signature
+        self.name, types = parse_signature(signature)
+        self.selector = utils.sha3(signature)[:4]
+        self.inputs = TupleType([parse_type(t) for t in types])
+        self.outputs = TupleType([parse_type(t) for t in result_types or []])
+
+    def encode(self, args):
+        '''
+        Return the call data (selector and encoded arguments); args may be
+        None for a function without arguments
+        '''
+        if args is None:
+            args = []
+        return self.selector + self.inputs.encode(args)
+
+    def decode(self, data):
+        '''
+        Decode the raw return data into a list of values
+        '''
+        return list(self.outputs.decode(data))
+
+
+_functions = {}
+_functions_lock = threading.Lock()
+
+
+def get_function(signature, result_types=None):
+    '''
+    Return the ContractFunction for a signature and result types, compiling
+    it only the first time it is requested
+    '''
+    key = signature, tuple(result_types or ())
+    try:
+        return _functions[key]
+    except KeyError:
+        with _functions_lock:
+            if key not in _functions:
+                _functions[key] = ContractFunction(signature, result_types)
+            return _functions[key]
@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from ethjsonrpc.client import (EthJsonRpc, ParityEthJsonRpc, GETH_DEFAULT_RPC_PORT,
+                               PARITY_DEFAULT_RPC_PORT)
+
+DEFAULT_MAX_WORKERS = 32
+ASYNC_PREFIXES = ('web3_', 'net_', 'eth_', 'db_', 'shh_', 'trace_')
+ASYNC_METHODS = ('transfer', 'create_contract', 'get_contract_address', 'wait_for_receipt', 'wait_for_receipts',
+                 'call', 'multi_call', 'call_with_transaction')
+
+
+class AsyncEthJsonRpc(object):
+    '''
+    Non-blocking Ethereum JSON-RPC client class
+
+    Every JSON-RPC method and high-level method of EthJsonRpc (see
+    ASYNC_METHODS) is available and returns a concurrent.futures.Future
+    instead of the result. The iterators (iter_blocks, get_logs_range,
+    iter_logs, iter_trace_filter, iter_trace_block) and batch() are
+    returned as they are and run on the caller's thread. Calls run
+    on a bounded pool of max_workers workers sharing a connection pool of the
+    same size, so any number of calls can be in flight without a thread per
+    call. Parameters and results are handled by the wrapped EthJsonRpc, so
+    both clients always return the same values.
+    '''
+
+    client_class = EthJsonRpc
+
+    def __init__(self, host='localhost', port=GETH_DEFAULT_RPC_PORT, tls=False,
+                 max_workers=DEFAULT_MAX_WORKERS, **kwargs):
+        self.client = self.client_class(host=host, port=port, tls=tls, pool_size=max_workers, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers)
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not (name.startswith(ASYNC_PREFIXES) or name in ASYNC_METHODS):
+            return attr
+
+        def submit(*args, **kwargs):
+            return self.executor.submit(attr, *args, **kwargs)
+        return submit
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self, wait=True):
+        '''
+        Stop accepting calls and release the workers and connections
+        '''
+        self.executor.shutdown(wait=wait)
+        self.client.session.close()
+
+
+class AsyncParityEthJsonRpc(AsyncEthJsonRpc):
+    '''
+    AsyncEthJsonRpc subclass for Parity-specific methods
+    '''
+
+    client_class = ParityEthJsonRpc
+
+    def __init__(self, host='localhost', port=PARITY_DEFAULT_RPC_PORT, tls=False,
+                 max_workers=DEFAULT_MAX_WORKERS, **kwargs):
+        AsyncEthJsonRpc.__init__(self, host=host, port=port, tls=tls, max_workers=max_workers, **kwargs)
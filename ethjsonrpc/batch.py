@@ -0,0 +1,166 @@
+import inspect
+
+from ethjsonrpc.cache import MISS
+from ethjsonrpc.exceptions import BadResponseError
+
+BATCH_MAX_SIZE = 100
+
+
+class BatchCall(object):
+    '''
+    Handle for a single call queued in a batch. The result becomes available
+    once the batch has been sent.
+    '''
+
+    def __init__(self, _id, method, params, result_fn=None):
+        self.id = _id
+        self.method = method
+        self.params = params
+        self.result_fn = result_fn
+        self.missed = []  # caches to fill with the result
+        self.done = False
+        self.error = None
+        self._result = None
+
+    def _set_response(self, response):
+        self.done = True
+        try:
+            result = response['result']
+        except KeyError:
+            self.error = BadResponseError(response)
+            return
+        if self.result_fn is not None:
+            result = self.result_fn(result)
+        self._result = result
+
+    def result(self):
+        '''
+        Return the decoded result, or raise the error returned by the node
+        for this call
+        '''
+        if not self.done:
+            raise RuntimeError('batch has not been sent yet')
+        if self.error is not None:
+            raise self.error
+        return self._result
+
+    def __repr__(self):
+        return '<BatchCall id={} method={}>'.format(self.id, self.method)
+
+
+class Batch(object):
+    '''
+    Queue JSON-RPC calls and send them to the node as JSON-RPC 2.0 batch
+    requests.
+
+    Every JSON-RPC method of the wrapped client is available on the batch and
+    returns a ``BatchCall`` instead of the result:
+
+    >>> batch = c.batch()
+    >>> balance = batch.eth_getBalance(addr)
+    >>> receipt = batch.eth_getTransactionReceipt(tx)
+    >>> batch.send()
+    >>> balance.result()
+
+    Calls made from inside a queued method (for example the coinbase lookup
+    when no address is given) go straight to the node.
+    '''
+
+    def __init__(self, client, max_size=BATCH_MAX_SIZE):
+        self.client = client
+        self.max_size = max_size
+        self.calls = []
+        self._depth = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if self._depth or name.startswith('_') or not inspect.ismethod(attr):
+            return attr
+        func = attr.__func__
+
+        def queue(*args, **kwargs):
+            self._depth += 1
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                self._depth -= 1
+        return queue
+
+    def _call(self, method, params=None, _id=None, result_fn=None):
+        call = BatchCall(len(self.calls) + 1, method, params or [], result_fn)
+        self.calls.append(call)
+        return call
+
+    def __len__(self):
+        return len(self.calls)
+
+    def __getitem__(self, _id):
+        return self.calls[_id - 1]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.send()
+
+    def send(self):
+        '''
+        Send all queued calls that have not been sent yet, in chunks of at
+        most ``max_size`` calls per HTTP request. Calls the client's caches
+        can answer are not sent, and the caches are filled with the results
+        of those that are. Returns the list of ``BatchCall`` handles in the
+        order they were queued.
+        '''
+        pending = []
+        for call in self.calls:
+            if call.done:
+                continue
+            result, call.missed = self.client._cache_get(call.method, call.params)
+            if result is MISS:
+                pending.append(call)
+            else:
+                call._set_response({'id': call.id, 'result': result})
+        for i in range(0, len(pending), self.max_size):
+            self._send_chunk(pending[i:i + self.max_size])
+        return self.calls
+
+    def _send_chunk(self, chunk):
+        '''
+        Send one chunk of calls. Under a retry policy, calls failing with a
+        retryable error are sent again (without the others), sharing the
+        policy's attempts and deadline with failures of the whole request.
+        '''
+        retry = self.client.retry
+        failed = {}  # call id -> last response, for calls to send again
+        partial = []
+
+        def post():
+            todo = [call for call in chunk if not call.done]
+            data = [self.client._request(call.method, call.params, call.id) for call in todo]
+            response = self.client._post(data)
+            if not isinstance(response, list):
+                raise BadResponseError(response)
+            by_id = dict((r.get('id'), r) for r in response)
+            for call in todo:
+                item = by_id.get(call.id, {'id': call.id})
+                if 'result' not in item and retry is not None and retry.retryable(BadResponseError(item)):
+                    failed[call.id] = item
+                    continue
+                failed.pop(call.id, None)
+                if 'result' in item:
+                    self.client._cache_put(call.missed, call.method, call.params, item['result'])
+                call._set_response(item)
+            if failed:
+                partial[:] = [BadResponseError(next(iter(failed.values())))]
+                raise partial[0]
+
+        data = [self.client._request(call.method, call.params, call.id) for call in chunk]
+        try:
+            self.client._retrying(post, data)
+        except BadResponseError as e:
+            if not partial or e is not partial[0]:
+                raise
+            for call in chunk:
+                if not call.done:
+                    call._set_response(failed[call.id])
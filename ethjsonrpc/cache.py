@@ -0,0 +1,261 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from ethjsonrpc.constants import BLOCK_TAG_LATEST
+from ethjsonrpc.exceptions import EthJsonRpcError
+from ethjsonrpc.utils import hex_to_dec
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CONFIRMATIONS = 12
+HEAD_TTL = 15  # seconds
+
+# methods whose result never changes once the block it refers to is final,
+# mapped to the index of their block parameter (None if keyed by hash)
+IMMUTABLE_METHODS = {
+    'eth_getBlockByHash':        None,
+    'eth_getTransactionByHash':  None,
+    'eth_getTransactionReceipt': None,
+    'trace_transaction':         None,
+    'eth_getBlockByNumber':      0,
+    'eth_getCode':               1,
+}
+
+# methods whose result only changes when a new block arrives, mapped to the
+# index of their block parameter (None if they have none); cached only when
+# asked about the latest block
+HEAD_METHODS = {
+    'eth_blockNumber':         None,
+    'eth_gasPrice':            None,
+    'eth_getBalance':          1,
+    'eth_getTransactionCount': 1,
+    'eth_getCode':             1,
+    'eth_getStorageAt':        2,
+    'eth_call':                1,
+}
+HEAD_POLL_INTERVAL = 1  # seconds
+
+MISS = object()
+
+
+def block_number(value):
+    '''
+    Return a block number given as int or hex string, or None for block tags
+    and missing values
+    '''
+    if isinstance(value, (int, long)):
+        return value
+    if isinstance(value, basestring) and value.startswith('0x'):
+        return int(value, 16)
+    return None
+
+
+class ResponseCache(object):
+    '''
+    Size-bounded LRU cache for JSON-RPC results that cannot change once the
+    block they belong to has at least `confirmations` blocks on top of it.
+    Results tied to a block tag ('latest', 'pending', ...) and results from
+    blocks that are not yet final are never stored. Results are kept JSON
+    encoded, so every hit returns a fresh copy the caller may change.
+    '''
+
+    methods = IMMUTABLE_METHODS
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, confirmations=DEFAULT_CONFIRMATIONS, head_ttl=HEAD_TTL):
+        self.max_size = max_size
+        self.confirmations = confirmations
+        self.head_ttl = head_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._head = None
+        self._head_time = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return 1.0 * self.hits / total if total else 0.0
+
+    def cacheable(self, method, params):
+        '''
+        Whether a request may be answered from the cache at all
+        '''
+        if method not in self.methods:
+            return False
+        index = self.methods[method]
+        return index is None or block_number(params[index]) is not None
+
+    def _key(self, method, params):
+        return method, json.dumps(params)
+
+    def get(self, method, params):
+        '''
+        Return the cached result, or MISS
+        '''
+        result = self._load(self._key(method, params))
+        with self._lock:
+            if result is MISS:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def _load(self, key):
+        with self._lock:
+            try:
+                encoded = self._entries.pop(key)
+            except KeyError:
+                return MISS
+            self._entries[key] = encoded
+        return json.loads(encoded)
+
+    def put(self, method, params, result, head_fn):
+        '''
+        Store a result if the block it belongs to is final. head_fn returns
+        the current block number and is only called when the cached head is
+        older than head_ttl.
+        '''
+        if result is None:
+            return
+        index = self.methods[method]
+        if index is not None:
+            number = block_number(params[index])
+        elif method == 'eth_getBlockByHash':
+            number = None
+        elif method == 'trace_transaction':
+            number = block_number(result[0].get('blockNumber')) if result else None
+            if number is None:
+                return
+        else:
+            number = block_number(result.get('blockNumber'))
+            if number is None:
+                return
+        if number is not None and number > self.head(head_fn) - self.confirmations:
+            return
+        self._save(self._key(method, params), result)
+
+    def _save(self, key, result):
+        encoded = json.dumps(result)
+        with self._lock:
+            self._entries[key] = encoded
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def head(self, head_fn):
+        '''
+        Return the current block number, refreshing it with head_fn at most
+        once per head_ttl seconds
+        '''
+        now = time.time()
+        if self._head is None or now - self._head_time > self.head_ttl:
+            self._head = head_fn()
+            self._head_time = now
+        return self._head
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class HeadCache(ResponseCache):
+    '''
+    Cache for reads of the latest state (balances, nonces, eth_call, gas
+    price, block number) that holds results for the current head block only:
+    everything is dropped as soon as a new block is seen. The head is
+    checked at most once per poll_interval seconds, with eth_blockNumber or,
+    with block_filter=True, with a block filter (which also notices a reorg
+    replacing the head at the same height).
+
+    Pass it to EthJsonRpc as head_cache.
+    '''
+
+    methods = HEAD_METHODS
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, poll_interval=HEAD_POLL_INTERVAL, block_filter=False):
+        ResponseCache.__init__(self, max_size=max_size)
+        self.poll_interval = poll_interval
+        self.block_filter = block_filter
+        self.client = None
+        self.block = None
+        self._filter_id = None
+        self._checked = 0
+        self._generation = 0
+        self._check_lock = threading.Lock()
+        self._local = threading.local()
+
+    def bind(self, client):
+        self.client = client
+
+    def cacheable(self, method, params):
+        if method not in self.methods:
+            return False
+        index = self.methods[method]
+        if index is None:
+            return True
+        # the block parameter defaults to latest when omitted
+        return len(params) <= index or params[index] == BLOCK_TAG_LATEST
+
+    def get(self, method, params):
+        if time.time() - self._checked > self.poll_interval:
+            self.check_head()
+        # results fetched after this may only be stored if the head does not
+        # change before they come back
+        self._local.generation = self._generation
+        return ResponseCache.get(self, method, params)
+
+    def put(self, method, params, result, head_fn):
+        if getattr(self._local, 'generation', None) != self._generation:
+            return
+        self._save(self._key(method, params), result)
+
+    def check_head(self):
+        '''
+        Look for a new head and drop all entries if there is one. Only one
+        thread checks at a time; others keep using the current entries.
+        '''
+        if not self._check_lock.acquire(False):
+            return
+        try:
+            self._checked = time.time()
+            if self.block_filter:
+                changed = self._filter_changed()
+            else:
+                # bypass the client's caches, this one included
+                result = self.client._send('eth_blockNumber', [], 1)
+                block = hex_to_dec(result)
+                changed = block != self.block
+                self.block = block
+            if changed:
+                with self._lock:
+                    self._generation += 1
+                    self._entries.clear()
+                if not self.block_filter:
+                    self._save(self._key('eth_blockNumber', []), result)
+        finally:
+            self._check_lock.release()
+
+    def _filter_changed(self):
+        if self._filter_id is None:
+            self._filter_id = self.client.eth_newBlockFilter()
+            return True
+        try:
+            hashes = self.client.eth_getFilterChanges(self._filter_id)
+        except EthJsonRpcError:
+            # the node dropped the filter; blocks may have been missed since
+            self._filter_id = None
+            return True
+        if hashes:
+            self.block = hashes[-1]
+        return bool(hashes)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+        ResponseCache.clear(self)
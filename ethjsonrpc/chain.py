@@ -0,0 +1,45 @@
+from ethjsonrpc.cache import block_number
+
+REORG_DEPTH = 64
+
+
+class ChainTracker(object):
+    '''
+    Remembers the hashes of the last `depth` canonical blocks to notice
+    reorgs: a new block whose parent hash does not match the block tracked
+    at the height below it (or a new block at a height already tracked)
+    means the chain has switched forks.
+    '''
+
+    def __init__(self, depth=REORG_DEPTH):
+        self.depth = depth
+        self.hashes = {}  # block number -> hash
+        self.head = None
+
+    def add(self, block, fetch):
+        '''
+        Record a new head block (a dict with number, hash and parentHash)
+        and return the hashes of the blocks it drops from the canonical
+        chain, newest first. fetch(number) returns the canonical block at a
+        height and is used to walk back to the common ancestor.
+        '''
+        number = block_number(block['number'])
+        if self.hashes.get(number) == block['hash']:
+            return []
+        # blocks at or above the new head are no longer canonical
+        removed = [self.hashes.pop(n) for n in sorted(self.hashes, reverse=True) if n >= number]
+        parent = block['parentHash']
+        n = number - 1
+        while n in self.hashes and self.hashes[n] != parent:
+            removed.append(self.hashes[n])
+            self.hashes[n] = parent
+            ancestor = fetch(n)
+            if ancestor is None:
+                break
+            parent = ancestor['parentHash']
+            n -= 1
+        self.hashes[number] = block['hash']
+        self.head = number
+        for n in [n for n in self.hashes if n <= number - self.depth]:
+            del self.hashes[n]
+        return removed
@@ -1,23 +1,59 @@
-import json
 import warnings
 
 import requests
 from requests.adapters import HTTPAdapter
-from requests.exceptions import ConnectionError as RequestsConnectionError
-from ethereum import utils
-from ethereum.abi import encode_abi, decode_abi
-
-from ethjsonrpc.constants import BLOCK_TAGS, BLOCK_TAG_LATEST
-from ethjsonrpc.utils import hex_to_dec, clean_hex, validate_block
-from ethjsonrpc.exceptions import (ConnectionError, BadStatusCodeError,
-                                   BadJsonError, BadResponseError)
+from requests.packages.urllib3.exceptions import MaxRetryError, ConnectTimeoutError as Urllib3ConnectError
+from requests.packages.urllib3.util.retry import Retry
+from requests.exceptions import (ConnectionError as RequestsConnectionError, ConnectTimeout as RequestsConnectTimeout,
+                                 Timeout as RequestsTimeout)
+
+from ethjsonrpc.constants import BLOCK_TAGS, BLOCK_TAG_LATEST, READ_ONLY_METHODS
+from ethjsonrpc.utils import hex_to_dec, clean_hex, validate_block, ordered_map
+from ethjsonrpc.abi import get_function
+from ethjsonrpc.batch import Batch, BATCH_MAX_SIZE
+from ethjsonrpc.cache import MISS
+from ethjsonrpc.coalesce import SingleFlight
+from ethjsonrpc.receipts import ReceiptWaiter, RECEIPT_POLL_INTERVAL
+from ethjsonrpc.codec import default_codec
+from ethjsonrpc.stream import ResultStream, STREAM_CHUNK_SIZE
+from ethjsonrpc.models import Block, Transaction, Receipt, Log, Trace
+from ethjsonrpc.exceptions import (ConnectionError, TimeoutError, ConnectError, ConnectTimeoutError,
+                                   BadStatusCodeError, BadJsonError, BadResponseError)
 
 GETH_DEFAULT_RPC_PORT = 8545
 ETH_DEFAULT_RPC_PORT = 8545
 PARITY_DEFAULT_RPC_PORT = 8545
 PYETHAPP_DEFAULT_RPC_PORT = 4000
 MAX_RETRIES = 3
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = (10, 60)  # (connect, read) in seconds
+BLOCKS_PER_BATCH = 10
+DEFAULT_CONCURRENCY = 8
+RANGE_INITIAL_WINDOW = 1000
+RANGE_MAX_WINDOW = 100000
+RANGE_MAX_RESULTS = 10000
+# fragments of the error messages nodes use to reject a too expensive query
+# (not 'limit' or 'exceed', which rate limit errors use too)
+RANGE_ERROR_MESSAGES = ('too many', 'more than', 'too large', 'timeout', 'timed out', 'query returned',
+                        'response size', 'block range')
 JSON_MEDIA_TYPE = 'application/json'
+THROTTLE_STATUS_CODES = (429, 503)
+# Multicall3, deployed at the same address on mainnet and most other chains
+MULTICALL_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+MULTICALL_TRY_AGGREGATE = 'tryAggregate(bool,(address,bytes)[])'
+MULTICALL_CHUNK_SIZE = 500
+
+
+def _closing(close, release):
+    '''
+    Return a close function that calls release once close has run
+    '''
+    def close_and_release():
+        try:
+            close()
+        finally:
+            release()
+    return close_and_release
 
 
 class EthJsonRpc(object):
@@ -28,60 +64,208 @@ class EthJsonRpc(object):
     DEFAULT_GAS_PER_TX = 90000
     DEFAULT_GAS_PRICE = 50 * 10**9  # 50 gwei
 
-    def __init__(self, host='localhost', port=GETH_DEFAULT_RPC_PORT, tls=False):
+    def __init__(self, host='localhost', port=GETH_DEFAULT_RPC_PORT, tls=False,
+                 pool_size=DEFAULT_POOL_SIZE, max_retries=MAX_RETRIES, timeout=DEFAULT_TIMEOUT, cache=None,
+                 store=None, codec=None, typed=False, limiter=None,
+                 retry=None, coalesce=False, head_cache=None):
         self.host = host
         self.port = port
         self.tls = tls
+        self.timeout = timeout
+        self.cache = cache
+        self.store = store
+        self.codec = codec or default_codec()
+        self.typed = typed
+        self.limiter = limiter
+        self.retry = retry
+        # concurrent identical read-only calls share one request
+        self.flights = SingleFlight() if coalesce else None
+        self._coinbase = None
+        self.head_cache = head_cache
+        if head_cache is not None:
+            head_cache.bind(self)
+        # consulted in order, fastest first
+        self.caches = [c for c in (head_cache, cache, store) if c is not None]
+        scheme = 'http'
+        if self.tls:
+            scheme += 's'
+        self.url = '{}://{}:{}'.format(scheme, self.host, self.port)
+        self.headers = {'Content-Type': JSON_MEDIA_TYPE}
+        # mount on the endpoint URL (not the bare host) so that the adapter
+        # actually serves our requests; connections are kept alive in its pool.
+        # The adapter only retries failed connects: a request that may have
+        # reached the node (say an eth_sendTransaction whose response timed
+        # out) must not be posted again. A retry policy does all retrying
+        # itself, with backoff and deadline.
+        if retry is not None:
+            max_retries = 0
+        max_retries = Retry(total=max_retries, read=False, redirect=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=max_retries)
         self.session = requests.Session()
-        self.session.mount(self.host, HTTPAdapter(max_retries=MAX_RETRIES))
+        self.session.mount(self.url, adapter)
 
-    def _call(self, method, params=None, _id=1):
-
-        params = params or []
-        data = {
+    def _request(self, method, params=None, _id=1):
+        return {
             'jsonrpc': '2.0',
             'method':  method,
-            'params':  params,
+            'params':  params or [],
             'id':      _id,
         }
-        scheme = 'http'
-        if self.tls:
-            scheme += 's'
-        url = '{}://{}:{}'.format(scheme, self.host, self.port)
-        headers = {'Content-Type': JSON_MEDIA_TYPE}
+
+    def _limited(self, fn, data, hold=False):
+        '''
+        Return fn(), holding the limiter's budget (if any) for the request(s)
+        in data while it runs. With hold=True the budget is held until the
+        response fn returns is closed, for responses read as they stream in.
+        '''
+        if self.limiter is None:
+            return fn()
+        release = self.limiter.acquire(data)
+        held = False
         try:
-            r = self.session.post(url, headers=headers, data=json.dumps(data))
-        except RequestsConnectionError:
+            r = fn()
+            if hold:
+                r.close = _closing(r.close, release)
+                held = True
+        except BadStatusCodeError as e:
+            if e.args and e.args[0] in THROTTLE_STATUS_CODES:
+                self.limiter.penalize(data)
+            raise
+        finally:
+            if not held:
+                release()
+        self.limiter.reward(data)
+        return r
+
+    def _http_post(self, data, stream=False):
+        return self._limited(lambda: self._transport(data, stream=stream), data, hold=stream)
+
+    def _transport(self, data, stream=False):
+        try:
+            r = self.session.post(self.url, headers=self.headers, data=self.codec.dumps(data), timeout=self.timeout,
+                                  stream=stream)
+        except RequestsConnectTimeout:
+            raise ConnectTimeoutError
+        except RequestsTimeout:
+            raise TimeoutError
+        except RequestsConnectionError as e:
+            # the adapter gives up with MaxRetryError only on failed connects
+            reason = getattr(e.args[0], 'reason', None) if e.args else None
+            if isinstance(e.args[0], MaxRetryError) and isinstance(reason, Urllib3ConnectError):
+                raise ConnectError
             raise ConnectionError
         if r.status_code / 100 != 2:
+            r.close()
             raise BadStatusCodeError(r.status_code)
+        return r
+
+    def _post(self, data):
+        r = self._http_post(data)
         try:
-            response = r.json()
+            return self.codec.loads(r.content)
         except ValueError:
             raise BadJsonError(r.text)
-        try:
-            return response['result']
-        except KeyError:
-            raise BadResponseError(response)
 
-    def _encode_function(self, signature, param_values):
+    def _retrying(self, fn, data):
+        '''
+        Return fn(), retried according to the client's retry policy (if any)
+        '''
+        if self.retry is None:
+            return fn()
+        return self.retry.call(fn, data)
+
+    def _send(self, method, params, _id):
+        data = self._request(method, params, _id)
+
+        def send():
+            response = self._post(data)
+            try:
+                return response['result']
+            except KeyError:
+                raise BadResponseError(response)
 
-        prefix = utils.big_endian_to_int(utils.sha3(signature)[:4])
+        return self._retrying(send, data)
+
+    def _cache_get(self, method, params):
+        '''
+        Look a request up in the caches. Returns the result (or MISS) and the
+        caches that missed, to be filled with _cache_put once it is fetched.
+        '''
+        missed = []
+        for cache in self.caches:
+            if not cache.cacheable(method, params):
+                continue
+            result = cache.get(method, params)
+            if result is not MISS:
+                return result, missed
+            missed.append(cache)
+        return MISS, missed
 
-        if signature.find('(') == -1:
-            raise RuntimeError('Invalid function signature. Missing "(" and/or ")"...')
+    def _cache_put(self, caches, method, params, result):
+        for cache in caches:
+            cache.put(method, params, result, self.eth_blockNumber)
 
-        if signature.find(')') - signature.find('(') == 1:
-            return utils.encode_int(prefix)
+    def _call(self, method, params=None, _id=1, result_fn=None):
 
-        types = signature[signature.find('(') + 1: signature.find(')')].split(',')
-        encoded_params = encode_abi(types, param_values)
-        return utils.zpad(utils.encode_int(prefix), 4) + encoded_params
+        params = params or []
+        result, missed = self._cache_get(method, params)
+        if result is MISS:
+            if self.flights is not None and method in READ_ONLY_METHODS:
+                result = self.flights.call(method, params, lambda: self._send(method, params, _id))
+            else:
+                result = self._send(method, params, _id)
+        self._cache_put(missed, method, params, result)
+        if result_fn is not None:
+            result = result_fn(result)
+        return result
+
+    def _stream(self, method, params=None, _id=1, item_fn=None):
+        '''
+        Like _call for methods returning a list, but yield the items as they
+        are parsed off the socket instead of reading the whole response first
+        '''
+        data = self._request(method, params, _id)
+        r = self._retrying(lambda: self._http_post(data, stream=True), data)
+        try:
+            for item in ResultStream(r.iter_content(STREAM_CHUNK_SIZE)):
+                if item_fn is not None:
+                    item = item_fn(item)
+                yield item
+        finally:
+            r.close()
+
+    def _typed(self, cls, many=False):
+        '''
+        Return the result_fn converting results to cls when the client was
+        created with typed=True
+        '''
+        if not self.typed:
+            return None
+        return cls.from_list if many else cls.from_json
+
+    def _default_account(self):
+        '''
+        Return the coinbase, used when no account is given. It is looked up
+        once rather than on every call.
+        '''
+        if self._coinbase is None:
+            self._coinbase = self.eth_coinbase()
+        return self._coinbase
+
+    def _encode_function(self, signature, param_values):
+        return get_function(signature).encode(param_values)
 
 ################################################################################
 # high-level methods
 ################################################################################
 
+    def batch(self, max_size=BATCH_MAX_SIZE):
+        '''
+        Return a Batch that queues calls and sends them to the node as
+        JSON-RPC batch requests of at most max_size calls
+        '''
+        return Batch(self, max_size=max_size)
+
     def transfer(self, from_, to, amount):
         '''
         Send wei from one address to another
@@ -93,18 +277,147 @@ class EthJsonRpc(object):
         Create a contract on the blockchain from compiled EVM code. Returns the
         transaction hash.
         '''
-        from_ = from_ or self.eth_coinbase()
+        from_ = from_ or self._default_account()
         if sig is not None and args is not None:
-             types = sig[sig.find('(') + 1: sig.find(')')].split(',')
-             encoded_params = encode_abi(types, args)
-             code += encoded_params.encode('hex')
+             code += get_function(sig).inputs.encode(args).encode('hex')
         return self.eth_sendTransaction(from_address=from_, gas=gas, data=code)
 
-    def get_contract_address(self, tx):
+    def iter_blocks(self, start, end=None, tx_objects=True, concurrency=DEFAULT_CONCURRENCY,
+                    batch_size=BLOCKS_PER_BATCH):
+        '''
+        Yield the blocks from start to end (inclusive, defaults to the current
+        block number) in order. Blocks are fetched in batches of batch_size
+        by concurrency workers, fetching only a bounded window ahead of the
+        consumer.
+        '''
+        if end is None:
+            end = self.eth_blockNumber()
+
+        def fetch(first):
+            batch = self.batch(max_size=batch_size)
+            for n in range(first, min(first + batch_size, end + 1)):
+                batch.eth_getBlockByNumber(n, tx_objects)
+            return [call.result() for call in batch.send()]
+
+        for blocks in ordered_map(fetch, range(start, end + 1, batch_size), concurrency):
+            for block in blocks:
+                yield block
+
+    def get_logs_range(self, from_block, to_block, address=None, topics=None, max_results=RANGE_MAX_RESULTS,
+                       window=RANGE_INITIAL_WINDOW, concurrency=DEFAULT_CONCURRENCY):
+        '''
+        Yield the logs between from_block and to_block (inclusive) in block
+        order. The range is queried in windows that are split when the node
+        rejects them as too large or too slow, and widened while they return
+        fewer than max_results / 2 logs, though never back to a size that
+        was rejected. Up to concurrency windows are fetched in parallel.
+        '''
+        def fetch(start, end):
+            filter_object = {'fromBlock': hex(start), 'toBlock': hex(end)}
+            if address is not None:
+                filter_object['address'] = address
+            if topics is not None:
+                filter_object['topics'] = topics
+            return self.eth_getLogs(filter_object)
+
+        return self._iter_range(fetch, from_block, to_block, max_results, window, concurrency)
+
+    def _iter_range(self, fetch, from_block, to_block, max_results, window, concurrency):
+        # the largest window that worked and the smallest one the node
+        # rejected: the window grows half way towards the rejected size, and
+        # falls back to the one that worked after a rejection
+        state = {'window': window, 'good': 0, 'rejected': RANGE_MAX_WINDOW + 1}
+
+        def reject(size):
+            state['rejected'] = min(state['rejected'], size)
+            if state['good'] >= state['rejected']:
+                state['good'] = 0
+            state['window'] = max(1, min(state['window'], max(state['good'], (size + 1) // 2)))
+
+        def accept(size, count):
+            if size < state['rejected']:
+                state['good'] = max(state['good'], size)
+            if count < max_results // 2 and size >= state['window']:
+                grown = min(RANGE_MAX_WINDOW, state['window'] * 2, (state['window'] + state['rejected']) // 2)
+                state['window'] = max(state['window'], grown)
+
+        def split(start, end):
+            results = []
+            step = state['window']
+            for first in range(start, end + 1, step):
+                results.extend(fetch_split(first, min(first + step - 1, end)))
+            return results
+
+        def fetch_split(start, end):
+            if end - start + 1 >= state['rejected']:
+                # queued before a smaller window was rejected
+                return split(start, end)
+            try:
+                results = fetch(start, end)
+            except (TimeoutError, BadStatusCodeError, BadResponseError) as e:
+                if start == end or not self._is_range_error(e):
+                    raise
+                reject(end - start + 1)
+                return split(start, end)
+            if len(results) > max_results and start < end:
+                reject(end - start + 1)
+            else:
+                accept(end - start + 1, len(results))
+            return results
+
+        def windows():
+            start = from_block
+            while start <= to_block:
+                end = min(start + state['window'] - 1, to_block)
+                yield start, end
+                start = end + 1
+
+        for results in ordered_map(lambda w: fetch_split(*w), windows(), concurrency):
+            for result in results:
+                yield result
+
+    def _is_range_error(self, e):
+        if isinstance(e, TimeoutError):
+            return True
+        if isinstance(e, BadStatusCodeError):
+            return e.args[0] in (413, 502, 504)
+        try:
+            message = e.args[0]['error']['message'].lower()
+        except (IndexError, KeyError, TypeError, AttributeError):
+            return False
+        return any(fragment in message for fragment in RANGE_ERROR_MESSAGES)
+
+    def wait_for_receipts(self, tx_hashes, timeout=None, poll_interval=RECEIPT_POLL_INTERVAL):
         '''
-        Get the address for a contract from the transaction that created it
+        Wait for the receipts of many transactions at once. Returns a
+        ReceiptWaiter: its futures map each hash to a future of the receipt,
+        and iterating it yields (hash, receipt) pairs as they arrive. The
+        missing receipts are fetched in one batch whenever a new block
+        arrives.
         '''
-        receipt = self.eth_getTransactionReceipt(tx)
+        return ReceiptWaiter(self, tx_hashes, timeout, poll_interval)
+
+    def wait_for_receipt(self, tx_hash, timeout=None, poll_interval=RECEIPT_POLL_INTERVAL):
+        '''
+        Return the receipt of a transaction once it is mined. Raises
+        concurrent.futures.TimeoutError after timeout seconds.
+        '''
+        return self.wait_for_receipts([tx_hash], timeout, poll_interval).futures[tx_hash].result()
+
+    def get_contract_address(self, tx, timeout=None, poll_interval=RECEIPT_POLL_INTERVAL):
+        '''
+        Get the address for a contract from the transaction that created it.
+        Returns None if the transaction is not mined yet, unless a timeout is
+        given: then it waits up to timeout seconds for it to be mined.
+        '''
+        if timeout is None:
+            receipt = self.eth_getTransactionReceipt(tx)
+            if receipt is None:
+                return None
+        else:
+            receipt = self.wait_for_receipt(tx, timeout, poll_interval)
+        if isinstance(receipt, Receipt):
+            return receipt.contract_address
         return receipt['contractAddress']
 
     def call(self, address, sig, args, result_types):
@@ -112,10 +425,67 @@ class EthJsonRpc(object):
         Call a contract function on the RPC server, without sending a
         transaction (useful for reading data)
         '''
-        data = self._encode_function(sig, args)
-        data_hex = data.encode('hex')
+        function = get_function(sig, result_types)
+        data_hex = function.encode(args).encode('hex')
         response = self.eth_call(to_address=address, data=data_hex)
-        return decode_abi(result_types, response[2:].decode('hex'))
+        return function.decode(response[2:].decode('hex'))
+
+    def multi_call(self, calls, block=None, multicall_address=MULTICALL_ADDRESS, chunk_size=MULTICALL_CHUNK_SIZE):
+        '''
+        Call many contract functions at the same block (defaults to the
+        current block number). calls is a list of (address, sig, args,
+        result_types) tuples; they are sent in chunks of chunk_size through
+        the Multicall3 aggregator contract, or as JSON-RPC batches of eth_call
+        if there is no aggregator at multicall_address (or it is None).
+        Returns a (success, result) tuple per call, where result is the
+        decoded result, or for failed calls the error or raw revert data.
+        '''
+        if block is None:
+            block = self.eth_blockNumber()
+        results = []
+        for i in range(0, len(calls), chunk_size):
+            chunk = calls[i:i + chunk_size]
+            functions = [get_function(sig, result_types) for _, sig, _, result_types in chunk]
+            data = [f.encode(args) for f, (_, _, args, _) in zip(functions, chunk)]
+            raw = None
+            if multicall_address is not None:
+                raw = self._multicall_aggregate(multicall_address, [c[0] for c in chunk], data, block)
+            if raw is None:
+                raw = self._multicall_batch([c[0] for c in chunk], data, block)
+            for function, (success, value) in zip(functions, raw):
+                if success:
+                    try:
+                        value = function.decode(value)
+                    except Exception as e:
+                        success, value = False, e
+                results.append((success, value))
+        return results
+
+    def _multicall_aggregate(self, multicall_address, addresses, data, block):
+        aggregate = get_function(MULTICALL_TRY_AGGREGATE, ['(bool,bytes)[]'])
+        targets = [a[2:] if a.startswith('0x') else a for a in addresses]
+        call_data = aggregate.encode([False, zip(targets, data)]).encode('hex')
+        try:
+            response = self.eth_call(to_address=multicall_address, data=call_data, default_block=block)
+        except BadResponseError:
+            return None
+        # without an aggregator deployed at this block the call returns no data
+        raw = aggregate.decode(response[2:].decode('hex'))[0] if len(response) > 2 else []
+        if len(raw) != len(data):
+            return None
+        return raw
+
+    def _multicall_batch(self, addresses, data, block):
+        batch = self.batch()
+        for address, d in zip(addresses, data):
+            batch.eth_call(to_address=address, data=d.encode('hex'), default_block=block)
+        raw = []
+        for call in batch.send():
+            try:
+                raw.append((True, call.result()[2:].decode('hex')))
+            except BadResponseError as e:
+                raw.append((False, e))
+        return raw
 
     def call_with_transaction(self, from_, address, sig, args, gas=None, gas_price=None, value=None):
         '''
@@ -172,7 +542,7 @@ class EthJsonRpc(object):
 
         TESTED
         '''
-        return hex_to_dec(self._call('net_peerCount'))
+        return self._call('net_peerCount', result_fn=hex_to_dec)
 
     def eth_protocolVersion(self):
         '''
@@ -212,7 +582,7 @@ class EthJsonRpc(object):
 
         TESTED
         '''
-        return hex_to_dec(self._call('eth_hashrate'))
+        return self._call('eth_hashrate', result_fn=hex_to_dec)
 
     def eth_gasPrice(self):
         '''
@@ -220,7 +590,7 @@ class EthJsonRpc(object):
 
         TESTED
         '''
-        return hex_to_dec(self._call('eth_gasPrice'))
+        return self._call('eth_gasPrice', result_fn=hex_to_dec)
 
     def eth_accounts(self):
         '''
@@ -236,7 +606,7 @@ class EthJsonRpc(object):
 
         TESTED
         '''
-        return hex_to_dec(self._call('eth_blockNumber'))
+        return self._call('eth_blockNumber', result_fn=hex_to_dec)
 
     def eth_getBalance(self, address=None, block=BLOCK_TAG_LATEST):
         '''
@@ -244,9 +614,9 @@ class EthJsonRpc(object):
 
         TESTED
         '''
-        address = address or self.eth_coinbase()
+        address = address or self._default_account()
         block = validate_block(block)
-        return hex_to_dec(self._call('eth_getBalance', [address, block]))
+        return self._call('eth_getBalance', [address, block], result_fn=hex_to_dec)
 
     def eth_getStorageAt(self, address=None, position=0, block=BLOCK_TAG_LATEST):
         '''
@@ -264,7 +634,7 @@ class EthJsonRpc(object):
         TESTED
         '''
         block = validate_block(block)
-        return hex_to_dec(self._call('eth_getTransactionCount', [address, block]))
+        return self._call('eth_getTransactionCount', [address, block], result_fn=hex_to_dec)
 
     def eth_getBlockTransactionCountByHash(self, block_hash):
         '''
@@ -272,7 +642,7 @@ class EthJsonRpc(object):
 
         TESTED
         '''
-        return hex_to_dec(self._call('eth_getBlockTransactionCountByHash', [block_hash]))
+        return self._call('eth_getBlockTransactionCountByHash', [block_hash], result_fn=hex_to_dec)
 
     def eth_getBlockTransactionCountByNumber(self, block=BLOCK_TAG_LATEST):
         '''
@@ -281,7 +651,7 @@ class EthJsonRpc(object):
         TESTED
         '''
         block = validate_block(block)
-        return hex_to_dec(self._call('eth_getBlockTransactionCountByNumber', [block]))
+        return self._call('eth_getBlockTransactionCountByNumber', [block], result_fn=hex_to_dec)
 
     def eth_getUncleCountByBlockHash(self, block_hash):
         '''
@@ -289,7 +659,7 @@ class EthJsonRpc(object):
 
         TESTED
         '''
-        return hex_to_dec(self._call('eth_getUncleCountByBlockHash', [block_hash]))
+        return self._call('eth_getUncleCountByBlockHash', [block_hash], result_fn=hex_to_dec)
 
     def eth_getUncleCountByBlockNumber(self, block=BLOCK_TAG_LATEST):
         '''
@@ -298,7 +668,7 @@ class EthJsonRpc(object):
         TESTED
         '''
         block = validate_block(block)
-        return hex_to_dec(self._call('eth_getUncleCountByBlockNumber', [block]))
+        return self._call('eth_getUncleCountByBlockNumber', [block], result_fn=hex_to_dec)
 
     def eth_getCode(self, address, default_block=BLOCK_TAG_LATEST):
         '''
@@ -327,7 +697,7 @@ class EthJsonRpc(object):
         NEEDS TESTING
         '''
         params = {}
-        params['from'] = from_address or self.eth_coinbase()
+        params['from'] = from_address or self._default_account()
         if to_address is not None:
             params['to'] = to_address
         if gas is not None:
@@ -357,9 +727,7 @@ class EthJsonRpc(object):
 
         NEEDS TESTING
         '''
-        if isinstance(default_block, basestring):
-            if default_block not in BLOCK_TAGS:
-                raise ValueError
+        default_block = validate_block(default_block)
         obj = {}
         obj['to'] = to_address
         if from_address is not None:
@@ -381,9 +749,7 @@ class EthJsonRpc(object):
 
         NEEDS TESTING
         '''
-        if isinstance(default_block, basestring):
-            if default_block not in BLOCK_TAGS:
-                raise ValueError
+        default_block = validate_block(default_block)
         obj = {}
         if to_address is not None:
             obj['to'] = to_address
@@ -397,7 +763,7 @@ class EthJsonRpc(object):
             obj['value'] = value
         if data is not None:
             obj['data'] = data
-        return hex_to_dec(self._call('eth_estimateGas', [obj, default_block]))
+        return self._call('eth_estimateGas', [obj, default_block], result_fn=hex_to_dec)
 
     def eth_getBlockByHash(self, block_hash, tx_objects=True):
         '''
@@ -405,7 +771,7 @@ class EthJsonRpc(object):
 
         TESTED
         '''
-        return self._call('eth_getBlockByHash', [block_hash, tx_objects])
+        return self._call('eth_getBlockByHash', [block_hash, tx_objects], result_fn=self._typed(Block))
 
     def eth_getBlockByNumber(self, block=BLOCK_TAG_LATEST, tx_objects=True):
         '''
@@ -414,7 +780,7 @@ class EthJsonRpc(object):
         TESTED
         '''
         block = validate_block(block)
-        return self._call('eth_getBlockByNumber', [block, tx_objects])
+        return self._call('eth_getBlockByNumber', [block, tx_objects], result_fn=self._typed(Block))
 
     def eth_getTransactionByHash(self, tx_hash):
         '''
@@ -422,7 +788,7 @@ class EthJsonRpc(object):
 
         TESTED
         '''
-        return self._call('eth_getTransactionByHash', [tx_hash])
+        return self._call('eth_getTransactionByHash', [tx_hash], result_fn=self._typed(Transaction))
 
     def eth_getTransactionByBlockHashAndIndex(self, block_hash, index=0):
         '''
@@ -430,7 +796,8 @@ class EthJsonRpc(object):
 
         TESTED
         '''
-        return self._call('eth_getTransactionByBlockHashAndIndex', [block_hash, hex(index)])
+        return self._call('eth_getTransactionByBlockHashAndIndex', [block_hash, hex(index)],
+                          result_fn=self._typed(Transaction))
 
     def eth_getTransactionByBlockNumberAndIndex(self, block=BLOCK_TAG_LATEST, index=0):
         '''
@@ -439,7 +806,8 @@ class EthJsonRpc(object):
         TESTED
         '''
         block = validate_block(block)
-        return self._call('eth_getTransactionByBlockNumberAndIndex', [block, hex(index)])
+        return self._call('eth_getTransactionByBlockNumberAndIndex', [block, hex(index)],
+                          result_fn=self._typed(Transaction))
 
     def eth_getTransactionReceipt(self, tx_hash):
         '''
@@ -447,7 +815,7 @@ class EthJsonRpc(object):
 
         TESTED
         '''
-        return self._call('eth_getTransactionReceipt', [tx_hash])
+        return self._call('eth_getTransactionReceipt', [tx_hash], result_fn=self._typed(Receipt))
 
     def eth_getUncleByBlockHashAndIndex(self, block_hash, index=0):
         '''
@@ -455,7 +823,7 @@ class EthJsonRpc(object):
 
         TESTED
         '''
-        return self._call('eth_getUncleByBlockHashAndIndex', [block_hash, hex(index)])
+        return self._call('eth_getUncleByBlockHashAndIndex', [block_hash, hex(index)], result_fn=self._typed(Block))
 
     def eth_getUncleByBlockNumberAndIndex(self, block=BLOCK_TAG_LATEST, index=0):
         '''
@@ -464,7 +832,7 @@ class EthJsonRpc(object):
         TESTED
         '''
         block = validate_block(block)
-        return self._call('eth_getUncleByBlockNumberAndIndex', [block, hex(index)])
+        return self._call('eth_getUncleByBlockNumberAndIndex', [block, hex(index)], result_fn=self._typed(Block))
 
     def eth_getCompilers(self):
         '''
@@ -505,11 +873,14 @@ class EthJsonRpc(object):
         NEEDS TESTING
         '''
         _filter = {
-            'fromBlock': from_block,
-            'toBlock':   to_block,
-            'address':   address,
-            'topics':    topics,
+            'fromBlock': validate_block(from_block),
+            'toBlock':   validate_block(to_block),
         }
+        # nodes reject null address and topics, so leave them out
+        if address is not None:
+            _filter['address'] = address
+        if topics is not None:
+            _filter['topics'] = topics
         return self._call('eth_newFilter', [_filter])
 
     def eth_newBlockFilter(self):
@@ -526,7 +897,7 @@ class EthJsonRpc(object):
 
         TESTED
         '''
-        return hex_to_dec(self._call('eth_newPendingTransactionFilter'))
+        return self._call('eth_newPendingTransactionFilter')
 
     def eth_uninstallFilter(self, filter_id):
         '''
@@ -550,7 +921,7 @@ class EthJsonRpc(object):
 
         NEEDS TESTING
         '''
-        return self._call('eth_getFilterLogs', [filter_id])
+        return self._call('eth_getFilterLogs', [filter_id], result_fn=self._typed(Log, many=True))
 
     def eth_getLogs(self, filter_object):
         '''
@@ -558,7 +929,14 @@ class EthJsonRpc(object):
 
         NEEDS TESTING
         '''
-        return self._call('eth_getLogs', [filter_object])
+        return self._call('eth_getLogs', [filter_object], result_fn=self._typed(Log, many=True))
+
+    def iter_logs(self, filter_object):
+        '''
+        Streaming variant of eth_getLogs: yield the logs one at a time while
+        the response is being received
+        '''
+        return self._stream('eth_getLogs', [filter_object], item_fn=self._typed(Log))
 
     def eth_getWork(self):
         '''
@@ -720,15 +1098,10 @@ class ParityEthJsonRpc(EthJsonRpc):
     EthJsonRpc subclass for Parity-specific methods
     '''
 
-    def __init__(self, host='localhost', port=PARITY_DEFAULT_RPC_PORT, tls=False):
-        EthJsonRpc.__init__(self, host=host, port=port, tls=tls)
-
-    def trace_filter(self, from_block=None, to_block=None, from_addresses=None, to_addresses=None):
-        '''
-        https://github.com/ethcore/parity/wiki/JSONRPC-trace-module#trace_filter
+    def __init__(self, host='localhost', port=PARITY_DEFAULT_RPC_PORT, tls=False, **kwargs):
+        EthJsonRpc.__init__(self, host=host, port=port, tls=tls, **kwargs)
 
-        TESTED
-        '''
+    def _trace_filter_params(self, from_block=None, to_block=None, from_addresses=None, to_addresses=None):
         params = {}
         if from_block is not None:
             from_block = validate_block(from_block)
@@ -744,7 +1117,36 @@ class ParityEthJsonRpc(EthJsonRpc):
             if not isinstance(to_addresses, list):
                 to_addresses = [to_addresses]
             params['toAddress'] = to_addresses
-        return self._call('trace_filter', [params])
+        return params
+
+    def trace_filter(self, from_block=None, to_block=None, from_addresses=None, to_addresses=None):
+        '''
+        https://github.com/ethcore/parity/wiki/JSONRPC-trace-module#trace_filter
+
+        TESTED
+        '''
+        params = self._trace_filter_params(from_block, to_block, from_addresses, to_addresses)
+        return self._call('trace_filter', [params], result_fn=self._typed(Trace, many=True))
+
+    def iter_trace_filter(self, from_block=None, to_block=None, from_addresses=None, to_addresses=None):
+        '''
+        Streaming variant of trace_filter: yield the traces one at a time
+        while the response is being received
+        '''
+        params = self._trace_filter_params(from_block, to_block, from_addresses, to_addresses)
+        return self._stream('trace_filter', [params], item_fn=self._typed(Trace))
+
+    def trace_filter_range(self, from_block, to_block, from_addresses=None, to_addresses=None,
+                           max_results=RANGE_MAX_RESULTS, window=RANGE_INITIAL_WINDOW,
+                           concurrency=DEFAULT_CONCURRENCY):
+        '''
+        Yield the traces between from_block and to_block (inclusive) in block
+        order, adapting the size of the queried windows like get_logs_range
+        '''
+        def fetch(start, end):
+            return self.trace_filter(start, end, from_addresses, to_addresses)
+
+        return self._iter_range(fetch, from_block, to_block, max_results, window, concurrency)
 
     def trace_get(self, tx_hash, positions):
         '''
@@ -754,7 +1156,7 @@ class ParityEthJsonRpc(EthJsonRpc):
         '''
         if not isinstance(positions, list):
             positions = [positions]
-        return self._call('trace_get', [tx_hash, positions])
+        return self._call('trace_get', [tx_hash, positions], result_fn=self._typed(Trace))
 
     def trace_transaction(self, tx_hash):
         '''
@@ -762,7 +1164,7 @@ class ParityEthJsonRpc(EthJsonRpc):
 
         TESTED
         '''
-        return self._call('trace_transaction', [tx_hash])
+        return self._call('trace_transaction', [tx_hash], result_fn=self._typed(Trace, many=True))
 
     def trace_block(self, block=BLOCK_TAG_LATEST):
         '''
@@ -771,4 +1173,12 @@ class ParityEthJsonRpc(EthJsonRpc):
         TESTED
         '''
         block = validate_block(block)
-        return self._call('trace_block', [block])
+        return self._call('trace_block', [block], result_fn=self._typed(Trace, many=True))
+
+    def iter_trace_block(self, block=BLOCK_TAG_LATEST):
+        '''
+        Streaming variant of trace_block: yield the traces one at a time
+        while the response is being received
+        '''
+        block = validate_block(block)
+        return self._stream('trace_block', [block], item_fn=self._typed(Trace))
@@ -0,0 +1,62 @@
+import json
+import threading
+
+
+class Flight(object):
+    '''
+    A call in flight, shared by every thread waiting for its result. The
+    result is kept JSON-encoded so each waiter decodes a copy of its own.
+    '''
+
+    __slots__ = ('done', 'encoded', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.encoded = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    '''
+    Coalesces concurrent identical calls: while a call for (method, params)
+    is in flight, other threads making the same call wait for it and share
+    its result (or its error) instead of sending their own request. Every
+    caller gets its own copy of the result, so one changing it does not
+    affect the others.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.shared = 0
+
+    def call(self, method, params, fn):
+        key = method, json.dumps(params)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+            else:
+                flight.waiters += 1
+                self.shared += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return json.loads(flight.encoded)
+        result = None
+        try:
+            result = fn()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            # nobody can join once the flight is removed
+            if flight.waiters and flight.error is None:
+                flight.encoded = json.dumps(result)
+            flight.done.set()
+        return result
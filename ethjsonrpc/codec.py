@@ -0,0 +1,65 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JsonCodec(object):
+    '''
+    Encodes requests and decodes responses with the standard library json
+    module. Responses are decoded straight from the body bytes.
+    '''
+
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'))
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class UjsonCodec(JsonCodec):
+    '''
+    JSON codec backed by ujson
+    '''
+
+    name = 'ujson'
+
+    def dumps(self, obj):
+        return ujson.dumps(obj)
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    '''
+    JSON codec backed by orjson
+    '''
+
+    name = 'orjson'
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+def default_codec():
+    '''
+    Return the fastest available codec, falling back to the standard library
+    '''
+    if orjson is not None:
+        return OrjsonCodec()
+    if ujson is not None:
+        return UjsonCodec()
+    return JsonCodec()
@@ -6,3 +6,17 @@ BLOCK_TAGS = (
     BLOCK_TAG_LATEST,
     BLOCK_TAG_PENDING,
 )
+
+# methods that only read chain state, so sending them twice (to retry them or
+# to hedge them across nodes) has no side effects
+READ_ONLY_METHODS = frozenset([
+    'web3_clientVersion', 'web3_sha3', 'net_version', 'net_peerCount', 'net_listening',
+    'eth_protocolVersion', 'eth_syncing', 'eth_gasPrice', 'eth_blockNumber', 'eth_getBalance',
+    'eth_getStorageAt', 'eth_getTransactionCount', 'eth_getBlockTransactionCountByHash',
+    'eth_getBlockTransactionCountByNumber', 'eth_getUncleCountByBlockHash', 'eth_getUncleCountByBlockNumber',
+    'eth_getCode', 'eth_call', 'eth_estimateGas', 'eth_getBlockByHash', 'eth_getBlockByNumber',
+    'eth_getTransactionByHash', 'eth_getTransactionByBlockHashAndIndex',
+    'eth_getTransactionByBlockNumberAndIndex', 'eth_getTransactionReceipt', 'eth_getUncleByBlockHashAndIndex',
+    'eth_getUncleByBlockNumberAndIndex', 'eth_getLogs',
+    'trace_filter', 'trace_get', 'trace_transaction', 'trace_block',
+])
@@ -6,6 +6,19 @@ class ConnectionError(EthJsonRpcError):
     pass
 
 
+class TimeoutError(ConnectionError):
+    pass
+
+
+# the connection could not be made, so the request never reached the node
+class ConnectError(ConnectionError):
+    pass
+
+
+class ConnectTimeoutError(ConnectError, TimeoutError):
+    pass
+
+
 class BadStatusCodeError(EthJsonRpcError):
     pass
 
@@ -0,0 +1,193 @@
+from decimal import Decimal
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from ethjsonrpc.models import RpcObject
+from ethjsonrpc.utils import hex_to_uint64_array, hex_to_dec_array
+
+EXPORT_BATCH_BLOCKS = 1000
+
+# (column, JSON key, kind) where kind is 'uint64' for quantities of at most
+# 64 bits, 'uint256' for wider quantities and 'str' for hashes and addresses
+BLOCK_COLUMNS = (
+    ('number', 'number', 'uint64'),
+    ('hash', 'hash', 'str'),
+    ('parent_hash', 'parentHash', 'str'),
+    ('miner', 'miner', 'str'),
+    ('timestamp', 'timestamp', 'uint64'),
+    ('difficulty', 'difficulty', 'uint64'),
+    ('gas_limit', 'gasLimit', 'uint64'),
+    ('gas_used', 'gasUsed', 'uint64'),
+    ('size', 'size', 'uint64'),
+)
+
+TRANSACTION_COLUMNS = (
+    ('hash', 'hash', 'str'),
+    ('block_number', 'blockNumber', 'uint64'),
+    ('transaction_index', 'transactionIndex', 'uint64'),
+    ('from', 'from', 'str'),
+    ('to', 'to', 'str'),
+    ('value', 'value', 'uint256'),
+    ('gas', 'gas', 'uint64'),
+    ('gas_price', 'gasPrice', 'uint64'),
+    ('nonce', 'nonce', 'uint64'),
+)
+
+RECEIPT_COLUMNS = (
+    ('transaction_hash', 'transactionHash', 'str'),
+    ('block_number', 'blockNumber', 'uint64'),
+    ('transaction_index', 'transactionIndex', 'uint64'),
+    ('gas_used', 'gasUsed', 'uint64'),
+    ('cumulative_gas_used', 'cumulativeGasUsed', 'uint64'),
+    ('status', 'status', 'uint64'),
+    ('contract_address', 'contractAddress', 'str'),
+)
+
+
+def _raw(obj):
+    if isinstance(obj, RpcObject):
+        return obj.to_dict()
+    return obj
+
+
+def to_columns(rows, columns):
+    '''
+    Convert a list of JSON-RPC result dicts into a dict of numpy arrays, one
+    per column. uint64 columns become uint64 arrays and uint256 columns
+    object arrays of exact ints. A column with missing values (such as the
+    status of pre-Byzantium receipts, or the recipient of a contract
+    creation) becomes a numpy masked array with those values masked.
+    '''
+    if numpy is None:
+        raise RuntimeError('numpy is required for columnar export')
+    rows = [_raw(row) for row in rows]
+    result = {}
+    for name, key, kind in columns:
+        values = [row.get(key) for row in rows]
+        if kind == 'str':
+            column = numpy.array([v or '' for v in values], dtype='S')
+        elif kind == 'uint64':
+            column = hex_to_uint64_array(values)
+        else:
+            column = hex_to_dec_array(values)
+        missing = numpy.fromiter((v is None for v in values), bool, len(values))
+        if missing.any():
+            column = numpy.ma.masked_array(column, mask=missing)
+        result[name] = column
+    return result
+
+
+def block_columns(blocks):
+    return to_columns(blocks, BLOCK_COLUMNS)
+
+
+def transaction_columns(blocks):
+    '''
+    Columns of all transactions of blocks fetched with tx_objects=True
+    '''
+    return to_columns([tx for block in blocks for tx in _raw(block)['transactions']], TRANSACTION_COLUMNS)
+
+
+def receipt_columns(receipts):
+    return to_columns(receipts, RECEIPT_COLUMNS)
+
+
+def to_structured_array(columns, names):
+    '''
+    Pack a dict of columns into a numpy structured array with fields in the
+    order of names. If any column is masked, so is the result.
+    '''
+    dtype = [(name, columns[name].dtype) for name in names]
+    length = len(columns[names[0]]) if names else 0
+    masked = any(numpy.ma.isMaskedArray(columns[name]) for name in names)
+    array = (numpy.ma.empty if masked else numpy.empty)(length, dtype=dtype)
+    for name in names:
+        array[name] = columns[name]
+    return array
+
+
+def to_record_batch(columns, names):
+    '''
+    Pack a dict of columns into a pyarrow RecordBatch. uint256 columns are
+    stored as decimal128(38, 0), which holds any wei amount below 10**38.
+    Masked values become nulls.
+    '''
+    if pyarrow is None:
+        raise RuntimeError('pyarrow is required for Arrow export')
+    arrays = []
+    for name in names:
+        column = columns[name]
+        mask = numpy.ma.getmaskarray(column) if numpy.ma.isMaskedArray(column) else None
+        column = numpy.ma.getdata(column)
+        if column.dtype == object:
+            values = [Decimal(v) for v in column]
+            if mask is not None:
+                values = [None if m else v for v, m in zip(values, mask)]
+            arrays.append(pyarrow.array(values, type=pyarrow.decimal128(38, 0)))
+        elif column.dtype.kind == 'S':
+            values = column.tolist()
+            if mask is not None:
+                values = [None if m else v for v, m in zip(values, mask)]
+            arrays.append(pyarrow.array(values, type=pyarrow.binary()).cast(pyarrow.string()))
+        else:
+            arrays.append(pyarrow.array(column, mask=mask))
+    return pyarrow.RecordBatch.from_arrays(arrays, list(names))
+
+
+class ParquetExporter(object):
+    '''
+    Write blocks, their transactions and optionally their receipts over a
+    block range to Parquet files, one row group per batch_blocks blocks
+    '''
+
+    def __init__(self, client, blocks_path, transactions_path=None, receipts_path=None,
+                 batch_blocks=EXPORT_BATCH_BLOCKS):
+        self.client = client
+        self.paths = {'blocks': blocks_path, 'transactions': transactions_path, 'receipts': receipts_path}
+        self.batch_blocks = batch_blocks
+        self._writers = {}
+
+    def _write(self, table, columns, spec):
+        names = [name for name, _, _ in spec]
+        batch = to_record_batch(columns, names)
+        if table not in self._writers:
+            self._writers[table] = pyarrow.parquet.ParquetWriter(self.paths[table], batch.schema)
+        self._writers[table].write_table(pyarrow.Table.from_batches([batch]))
+
+    def _flush(self, blocks):
+        self._write('blocks', block_columns(blocks), BLOCK_COLUMNS)
+        if self.paths['transactions'] is not None:
+            self._write('transactions', transaction_columns(blocks), TRANSACTION_COLUMNS)
+        if self.paths['receipts'] is not None:
+            batch = self.client.batch()
+            for block in blocks:
+                for tx in _raw(block)['transactions']:
+                    batch.eth_getTransactionReceipt(tx['hash'])
+            self._write('receipts', receipt_columns([call.result() for call in batch.send()]), RECEIPT_COLUMNS)
+
+    def export(self, start, end):
+        '''
+        Export the blocks from start to end (inclusive)
+        '''
+        blocks = []
+        try:
+            for block in self.client.iter_blocks(start, end, tx_objects=True):
+                blocks.append(block)
+                if len(blocks) == self.batch_blocks:
+                    self._flush(blocks)
+                    blocks = []
+            if blocks:
+                self._flush(blocks)
+        finally:
+            for writer in self._writers.values():
+                writer.close()
+            self._writers = {}
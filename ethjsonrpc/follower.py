@@ -0,0 +1,219 @@
+import json
+import os
+import threading
+
+from ethjsonrpc.chain import ChainTracker, REORG_DEPTH
+from ethjsonrpc.models import Block, Receipt, Trace
+from ethjsonrpc.exceptions import EthJsonRpcError
+from ethjsonrpc.utils import ordered_map
+
+FOLLOW_BATCH_SIZE = 10
+FOLLOW_FETCH_WORKERS = 4
+FOLLOW_DECODE_WORKERS = 1
+FOLLOW_POLL_INTERVAL = 1  # seconds
+CHECKPOINT_INTERVAL = 100  # blocks
+
+
+class FileCheckpoint(object):
+    '''
+    Keeps a ChainFollower's progress in a JSON file: the last block handed
+    to the sink and the hashes of the blocks before it, so reorgs are also
+    noticed across restarts. The file is replaced atomically.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        '''
+        Return (number, hashes), or None if nothing was saved yet
+        '''
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except IOError:
+            return None
+        return data['number'], dict((int(n), h) for n, h in data['hashes'].items())
+
+    def save(self, number, hashes):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'number': number, 'hashes': hashes}, f)
+        os.rename(tmp, self.path)
+
+
+class FollowedBlock(object):
+    '''
+    A block as fetched by a ChainFollower, with the receipts of its
+    transactions and its traces when they were asked for
+    '''
+
+    __slots__ = ('number', 'block', 'receipts', 'traces')
+
+    def __init__(self, number, block, receipts=None, traces=None):
+        self.number = number
+        self.block = block
+        self.receipts = receipts
+        self.traces = traces
+
+    def __repr__(self):
+        return '<FollowedBlock {}>'.format(self.number)
+
+
+def decode_models(followed):
+    '''
+    Default decode stage: convert the JSON results to result objects
+    '''
+    return FollowedBlock(followed.number, Block.from_json(followed.block), Receipt.from_list(followed.receipts),
+                         Trace.from_list(followed.traces))
+
+
+class ChainFollower(object):
+    '''
+    Follows the chain from a checkpoint through a pipeline of three stages:
+
+    - fetch: fetch_workers threads fetch batch_size blocks at a time with
+      their transactions, optionally their receipts and optionally their
+      trace_block traces, as batch requests
+    - decode: decode_workers threads run decode() on every FollowedBlock
+      (by default converting it to result objects)
+    - sink: sink() is called with each decoded block, in block order, from
+      the thread running the follower
+
+    Each stage holds a bounded window of work, so fetching only runs ahead
+    of the sink by a few batches. Progress is saved to the checkpoint every
+    checkpoint_interval blocks and whenever the follower catches up with
+    the head (minus `confirmations` blocks), after which it polls for new
+    blocks.
+
+    Blocks are checked against their parent hash before they reach the
+    sink. After a reorg, rollback(number) is called with the last block
+    still on the canonical chain, and following resumes after it.
+    '''
+
+    def __init__(self, client, sink, rollback=None, checkpoint=None, start=0, receipts=True, traces=False,
+                 decode=decode_models, confirmations=0, batch_size=FOLLOW_BATCH_SIZE,
+                 fetch_workers=FOLLOW_FETCH_WORKERS, decode_workers=FOLLOW_DECODE_WORKERS,
+                 poll_interval=FOLLOW_POLL_INTERVAL, checkpoint_interval=CHECKPOINT_INTERVAL,
+                 reorg_depth=REORG_DEPTH):
+        self.client = client
+        self.sink = sink
+        self.rollback = rollback
+        self.checkpoint = checkpoint
+        self.receipts = receipts
+        self.traces = traces
+        self.decode = decode
+        self.confirmations = confirmations
+        self.batch_size = batch_size
+        self.fetch_workers = fetch_workers
+        self.decode_workers = decode_workers
+        self.poll_interval = poll_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.tracker = ChainTracker(reorg_depth)
+        self.next_block = start
+        saved = checkpoint.load() if checkpoint is not None else None
+        if saved is not None:
+            number, self.tracker.hashes = saved
+            self.tracker.head = number
+            self.next_block = number + 1
+        self._saved = self.next_block - 1
+        self._stop = threading.Event()
+
+    def _fetch(self, first):
+        numbers = range(first, min(first + self.batch_size, self._end + 1))
+        batch = self.client.batch()
+        blocks = [batch._call('eth_getBlockByNumber', [hex(n), True]) for n in numbers]
+        traces = [batch._call('trace_block', [hex(n)]) for n in numbers] if self.traces else []
+        batch.send()
+        blocks = [call.result() for call in blocks]
+        # stop at a block the node does not have (yet)
+        if None in blocks:
+            blocks = blocks[:blocks.index(None)]
+        traces = [call.result() for call in traces[:len(blocks)]] or [None] * len(blocks)
+        receipts = [None] * len(blocks)
+        if self.receipts:
+            batch = self.client.batch()
+            calls = [[batch._call('eth_getTransactionReceipt', [tx['hash']]) for tx in block['transactions']]
+                     for block in blocks]
+            batch.send()
+            receipts = [[call.result() for call in block_calls] for block_calls in calls]
+        return [FollowedBlock(n, *args) for n, args in zip(numbers, zip(blocks, receipts, traces))]
+
+    def _decode(self, followed):
+        return [(f, self.decode(f)) for f in followed]
+
+    def _fetch_block(self, number):
+        return self.client._call('eth_getBlockByNumber', [hex(number), False])
+
+    def _save(self, number):
+        if self.checkpoint is not None:
+            self.checkpoint.save(number, self.tracker.hashes)
+        self._saved = number
+
+    def _reorged(self, block):
+        '''
+        Return the last canonical block number if block does not extend the
+        chain followed so far, or None
+        '''
+        number = int(block['number'], 16)
+        known = self.tracker.hashes.get(number - 1)
+        if known is None or known == block['parentHash']:
+            return None
+        removed = self.tracker.add(block, self._fetch_block)
+        ancestor = number - 1 - len(removed)
+        # the blocks after the ancestor are handed to the sink again
+        for n in [n for n in self.tracker.hashes if n > ancestor]:
+            del self.tracker.hashes[n]
+        self.tracker.head = ancestor
+        return ancestor
+
+    def follow(self, end):
+        '''
+        Hand the blocks from the next one up to end to the sink. Returns
+        False if it stopped early because of a reorg or a missing block.
+        '''
+        self._end = end
+        fetched = ordered_map(self._fetch, range(self.next_block, end + 1, self.batch_size), self.fetch_workers)
+        decoded = ordered_map(self._decode, fetched, self.decode_workers)
+        try:
+            for items in decoded:
+                for followed, item in items:
+                    if followed.number != self.next_block:
+                        return False
+                    ancestor = self._reorged(followed.block)
+                    if ancestor is not None:
+                        if self.rollback is not None:
+                            self.rollback(ancestor)
+                        self.next_block = ancestor + 1
+                        return False
+                    self.sink(item)
+                    self.tracker.add(followed.block, self._fetch_block)
+                    self.next_block = followed.number + 1
+                    if followed.number - self._saved >= self.checkpoint_interval:
+                        self._save(followed.number)
+                if self._stop.is_set():
+                    break
+        finally:
+            decoded.close()
+            fetched.close()
+            self._save(self.next_block - 1)
+        return True
+
+    def run(self):
+        '''
+        Follow the chain until stop() is called. Errors talking to the node
+        are retried after poll_interval; following resumes from the last
+        block handed to the sink.
+        '''
+        while not self._stop.is_set():
+            try:
+                head = self.client.eth_blockNumber() - self.confirmations
+                if self.next_block <= head:
+                    self.follow(head)
+                    continue
+            except EthJsonRpcError:
+                pass
+            self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
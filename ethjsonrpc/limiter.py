@@ -0,0 +1,154 @@
+import threading
+import time
+from contextlib import contextmanager
+
+PENALTY_INITIAL = 0.5  # seconds
+PENALTY_MAX = 30  # seconds
+
+
+class TokenBucket(object):
+    '''
+    Budget for one method family: at most `rate` requests per second with
+    bursts of up to `burst` requests, and at most `max_in_flight` requests
+    at once. Any limit left as None is not enforced. Waiting threads are
+    served in arrival order.
+    '''
+
+    def __init__(self, rate=None, burst=None, max_in_flight=None):
+        self.rate = rate
+        self.burst = burst or rate or 1
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._tokens = float(self.burst)
+        self._updated = time.time()
+        self._blocked_until = 0
+        self._penalty = 0
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _wait_time(self, now, cost):
+        '''
+        Return how long the head of the queue has to wait, 0 if it may go,
+        or None to wait for a release
+        '''
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+            return None
+        if self.rate is not None and self._tokens < min(cost, self.burst):
+            return (min(cost, self.burst) - self._tokens) / self.rate
+        return 0
+
+    def acquire(self, cost=1):
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while True:
+                timeout = None
+                if ticket == self._serving:
+                    now = time.time()
+                    self._refill(now)
+                    timeout = self._wait_time(now, cost)
+                    if timeout == 0:
+                        self._tokens -= cost
+                        self.in_flight += 1
+                        self._serving += 1
+                        self._cond.notify_all()
+                        return
+                self._cond.wait(timeout)
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def penalize(self):
+        '''
+        Stop admitting requests for a while after the node signalled overload;
+        the pause doubles on every consecutive penalty
+        '''
+        with self._cond:
+            self._penalty = min(PENALTY_MAX, self._penalty * 2 or PENALTY_INITIAL)
+            self._blocked_until = time.time() + self._penalty
+
+    def reward(self):
+        with self._cond:
+            self._penalty = 0
+
+
+class RateLimiter(object):
+    '''
+    Client-side governor for JSON-RPC requests. budgets maps method names or
+    prefixes (such as 'trace_' or 'eth_getLogs') to a TokenBucket; the
+    longest matching prefix wins and other methods use the default bucket
+    (if any). A batch costs one token per call in each family it touches.
+    '''
+
+    def __init__(self, budgets=None, default=None):
+        self.budgets = dict(budgets or {})
+        self.default = default
+        self._prefixes = sorted(self.budgets, key=len, reverse=True)
+
+    def bucket(self, method):
+        for prefix in self._prefixes:
+            if method.startswith(prefix):
+                return self.budgets[prefix]
+        return self.default
+
+    def _costs(self, data):
+        costs = {}
+        for request in data if isinstance(data, list) else [data]:
+            bucket = self.bucket(request['method'])
+            if bucket is not None:
+                costs[bucket] = costs.get(bucket, 0) + 1
+        # always take buckets in the same order so batches cannot deadlock
+        return sorted(costs.items(), key=lambda item: id(item[0]))
+
+    def acquire(self, data):
+        '''
+        Take the budget for a request (or a batch of requests). Returns the
+        function giving it back, which only does so the first time it is
+        called.
+        '''
+        acquired = []
+        try:
+            for bucket, cost in self._costs(data):
+                bucket.acquire(cost)
+                acquired.append(bucket)
+        except BaseException:
+            for bucket in acquired:
+                bucket.release()
+            raise
+        released = []
+
+        def release():
+            if not released:
+                released.append(True)
+                for bucket in acquired:
+                    bucket.release()
+        return release
+
+    @contextmanager
+    def limit(self, data):
+        '''
+        Hold the budget for a request (or a batch of requests) while it runs
+        '''
+        release = self.acquire(data)
+        try:
+            yield
+        finally:
+            release()
+
+    def penalize(self, data):
+        for bucket, _ in self._costs(data):
+            bucket.penalize()
+
+    def reward(self, data):
+        for bucket, _ in self._costs(data):
+            bucket.reward()
@@ -0,0 +1,269 @@
+from ethjsonrpc.utils import clean_hex
+
+
+class Quantity(object):
+    '''
+    Descriptor for a hex-encoded numeric field. The raw hex string is kept
+    until the field is first read; the decoded int then replaces it in the
+    slot, so every field is decoded at most once.
+    '''
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        try:
+            value = self.slot.__get__(obj, cls)
+        except AttributeError:
+            return None
+        if isinstance(value, basestring):
+            value = int(value, 16)
+            self.slot.__set__(obj, value)
+        return value
+
+
+class Field(object):
+    '''
+    Descriptor for a field returned as is. Fields missing from the result
+    read as None.
+    '''
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        try:
+            return self.slot.__get__(obj, cls)
+        except AttributeError:
+            return None
+
+
+class RpcObjectType(type):
+    '''
+    Builds the slots and descriptors of an RpcObject subclass from its
+    `fields` and `quantities`
+    '''
+
+    def __new__(mcs, name, bases, attrs):
+        fields = attrs.get('fields', ())
+        attrs['__slots__'] = tuple(attrs.get('__slots__', ())) + tuple('_' + attr for attr, _ in fields)
+        if 'fields' in attrs:
+            attrs['_json_keys'] = frozenset(key for _, key in fields)
+        cls = type.__new__(mcs, name, bases, attrs)
+        for attr, _ in fields:
+            slot = getattr(cls, '_' + attr)
+            descriptor = Quantity if attr in cls.quantities else Field
+            setattr(cls, attr, descriptor(slot))
+        return cls
+
+
+class RpcObject(object):
+    '''
+    Compact, read-only view of a JSON-RPC result object. Known fields are
+    stored in slots under snake_case names and numeric fields are decoded
+    lazily; any other keys are kept in `extra`.
+    '''
+
+    __metaclass__ = RpcObjectType
+    __slots__ = ('extra',)
+
+    fields = ()  # (attribute, JSON key)
+    quantities = ()
+
+    def __init__(self, data):
+        found = 0
+        for attr, key in self.fields:
+            if key in data:
+                setattr(self, '_' + attr, self._convert(attr, data[key]))
+                found += 1
+        if found < len(data):
+            known = self._json_keys
+            self.extra = dict((key, value) for key, value in data.iteritems() if key not in known)
+        else:
+            self.extra = None
+
+    def _convert(self, attr, value):
+        return value
+
+    @classmethod
+    def from_json(cls, data):
+        if data is None:
+            return None
+        return cls(data)
+
+    @classmethod
+    def from_list(cls, data):
+        if data is None:
+            return None
+        return [cls(item) for item in data]
+
+    def to_dict(self):
+        '''
+        Return the object as a JSON-RPC style dict with hex quantities
+        '''
+        data = dict(self.extra or {})
+        for attr, key in self.fields:
+            try:
+                value = getattr(self, '_' + attr)
+            except AttributeError:
+                continue
+            if attr in self.quantities and isinstance(value, (int, long)):
+                value = clean_hex(value)
+            elif isinstance(value, list):
+                value = [v.to_dict() if isinstance(v, RpcObject) else v for v in value]
+            data[key] = value
+        return data
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        key = getattr(self, 'hash', None) or getattr(self, 'transaction_hash', None)
+        return '<{} {}>'.format(type(self).__name__, key)
+
+
+class Transaction(RpcObject):
+
+    fields = (
+        ('hash', 'hash'),
+        ('nonce', 'nonce'),
+        ('block_hash', 'blockHash'),
+        ('block_number', 'blockNumber'),
+        ('transaction_index', 'transactionIndex'),
+        ('from_', 'from'),
+        ('to', 'to'),
+        ('value', 'value'),
+        ('gas_price', 'gasPrice'),
+        ('gas', 'gas'),
+        ('input', 'input'),
+        ('v', 'v'),
+        ('r', 'r'),
+        ('s', 's'),
+        ('type', 'type'),
+        ('chain_id', 'chainId'),
+        ('max_fee_per_gas', 'maxFeePerGas'),
+        ('max_priority_fee_per_gas', 'maxPriorityFeePerGas'),
+        ('access_list', 'accessList'),
+        ('y_parity', 'yParity'),
+        # Parity only
+        ('creates', 'creates'),
+        ('public_key', 'publicKey'),
+        ('raw', 'raw'),
+        ('standard_v', 'standardV'),
+        ('condition', 'condition'),
+    )
+    quantities = ('nonce', 'block_number', 'transaction_index', 'value', 'gas_price', 'gas', 'type', 'chain_id',
+                  'max_fee_per_gas', 'max_priority_fee_per_gas', 'y_parity', 'standard_v')
+
+
+class Block(RpcObject):
+
+    fields = (
+        ('number', 'number'),
+        ('hash', 'hash'),
+        ('parent_hash', 'parentHash'),
+        ('nonce', 'nonce'),
+        ('mix_hash', 'mixHash'),
+        ('sha3_uncles', 'sha3Uncles'),
+        ('logs_bloom', 'logsBloom'),
+        ('transactions_root', 'transactionsRoot'),
+        ('state_root', 'stateRoot'),
+        ('receipts_root', 'receiptsRoot'),
+        ('miner', 'miner'),
+        ('difficulty', 'difficulty'),
+        ('total_difficulty', 'totalDifficulty'),
+        ('extra_data', 'extraData'),
+        ('size', 'size'),
+        ('gas_limit', 'gasLimit'),
+        ('gas_used', 'gasUsed'),
+        ('timestamp', 'timestamp'),
+        ('transactions', 'transactions'),
+        ('uncles', 'uncles'),
+        ('base_fee_per_gas', 'baseFeePerGas'),
+        ('withdrawals_root', 'withdrawalsRoot'),
+        ('withdrawals', 'withdrawals'),
+        # Parity only
+        ('author', 'author'),
+        ('seal_fields', 'sealFields'),
+        ('step', 'step'),
+        ('signature', 'signature'),
+    )
+    quantities = ('number', 'difficulty', 'total_difficulty', 'size', 'gas_limit', 'gas_used', 'timestamp',
+                  'base_fee_per_gas')
+
+    def _convert(self, attr, value):
+        # transactions are hashes unless the block was fetched with tx_objects
+        if attr == 'transactions' and value and isinstance(value[0], dict):
+            return Transaction.from_list(value)
+        return value
+
+
+class Log(RpcObject):
+
+    fields = (
+        ('removed', 'removed'),
+        ('log_index', 'logIndex'),
+        ('transaction_index', 'transactionIndex'),
+        ('transaction_hash', 'transactionHash'),
+        ('block_hash', 'blockHash'),
+        ('block_number', 'blockNumber'),
+        ('address', 'address'),
+        ('data', 'data'),
+        ('topics', 'topics'),
+        # Parity only
+        ('transaction_log_index', 'transactionLogIndex'),
+        ('type', 'type'),
+    )
+    quantities = ('log_index', 'transaction_index', 'block_number', 'transaction_log_index')
+
+
+class Receipt(RpcObject):
+
+    fields = (
+        ('transaction_hash', 'transactionHash'),
+        ('transaction_index', 'transactionIndex'),
+        ('block_hash', 'blockHash'),
+        ('block_number', 'blockNumber'),
+        ('from_', 'from'),
+        ('to', 'to'),
+        ('cumulative_gas_used', 'cumulativeGasUsed'),
+        ('gas_used', 'gasUsed'),
+        ('contract_address', 'contractAddress'),
+        ('logs', 'logs'),
+        ('logs_bloom', 'logsBloom'),
+        ('root', 'root'),
+        ('status', 'status'),
+        ('type', 'type'),
+        ('effective_gas_price', 'effectiveGasPrice'),
+    )
+    quantities = ('transaction_index', 'block_number', 'cumulative_gas_used', 'gas_used', 'status', 'type',
+                  'effective_gas_price')
+
+    def _convert(self, attr, value):
+        if attr == 'logs':
+            return Log.from_list(value)
+        return value
+
+
+class Trace(RpcObject):
+
+    fields = (
+        ('type', 'type'),
+        ('action', 'action'),
+        ('result', 'result'),
+        ('error', 'error'),
+        ('trace_address', 'traceAddress'),
+        ('subtraces', 'subtraces'),
+        ('transaction_position', 'transactionPosition'),
+        ('transaction_hash', 'transactionHash'),
+        ('block_number', 'blockNumber'),
+        ('block_hash', 'blockHash'),
+    )
+    quantities = ('subtraces', 'transaction_position', 'block_number')
@@ -0,0 +1,316 @@
+import os
+import threading
+import time
+from collections import deque, OrderedDict
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from ethjsonrpc.client import EthJsonRpc, ParityEthJsonRpc
+from ethjsonrpc.constants import READ_ONLY_METHODS
+from ethjsonrpc.poller import FILTER_NOT_FOUND
+from ethjsonrpc.exceptions import ConnectionError, ConnectError, BadStatusCodeError, BadJsonError, EthJsonRpcError
+
+STRATEGY_LEAST_OUTSTANDING = 'least_outstanding'
+STRATEGY_LATENCY = 'latency'
+EWMA_ALPHA = 0.2
+UNHEALTHY_COOLDOWN = 10  # seconds
+LAG_CHECK_INTERVAL = 15  # seconds
+MAX_BLOCK_LAG = 3
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+LATENCY_SAMPLES = 500
+HEDGE_WORKERS = 32
+HEDGED_METHODS = READ_ONLY_METHODS
+FILTER_INSTALL_METHODS = frozenset(['eth_newFilter', 'eth_newBlockFilter', 'eth_newPendingTransactionFilter'])
+# calls naming a filter, which only the node that installed it knows
+FILTER_METHODS = frozenset(['eth_getFilterChanges', 'eth_getFilterLogs', 'eth_uninstallFilter'])
+
+
+class Endpoint(object):
+    '''
+    Routing state of one node behind a MultiEthJsonRpc
+    '''
+
+    def __init__(self, client):
+        self.client = client
+        self.outstanding = 0
+        self.latency = None
+        self.unhealthy_until = 0
+        self.block_number = None
+        self.lagging = False
+
+    def healthy(self, now):
+        return now >= self.unhealthy_until and not self.lagging
+
+    def __repr__(self):
+        return '<Endpoint {} outstanding={} latency={}>'.format(self.client.url, self.outstanding, self.latency)
+
+
+class MultiEthJsonRpc(EthJsonRpc):
+    '''
+    EthJsonRpc spreading requests over several nodes
+
+    Each request goes to the healthy node with the fewest requests in flight
+    (strategy='least_outstanding') or the lowest expected latency, an EWMA of
+    its response times scaled by its requests in flight (strategy='latency').
+    A node that fails with ConnectionError or BadStatusCodeError is skipped
+    for `cooldown` seconds and a read-only request (see READ_ONLY_METHODS)
+    is retried on the next node; any other request is only retried there if
+    it never reached the failed node (ConnectError). Every
+    `check_interval` seconds the nodes' block numbers are compared, and nodes
+    more than `max_lag` blocks behind the best one are skipped until they
+    catch up.
+
+    With hedge=True, a read-only request (see HEDGED_METHODS) that has not
+    been answered after the hedge_percentile latency of recent requests is
+    sent to a second node as well, and the first answer is used.
+
+    Calls on a filter (see FILTER_METHODS) go to the node that installed
+    it. Nodes may hand out the same filter ids, so an id already in use on
+    another node is replaced by a random one.
+    '''
+
+    def __init__(self, clients, strategy=STRATEGY_LEAST_OUTSTANDING, max_lag=MAX_BLOCK_LAG,
+                 check_interval=LAG_CHECK_INTERVAL, cooldown=UNHEALTHY_COOLDOWN, hedge=False,
+                 hedge_percentile=HEDGE_PERCENTILE, **kwargs):
+        if not clients:
+            raise ValueError('at least one client is required')
+        first = clients[0]
+        EthJsonRpc.__init__(self, host=first.host, port=first.port, tls=first.tls, **kwargs)
+        self.endpoints = [Endpoint(client) for client in clients]
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._last_check = 0
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedges = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._executor = ThreadPoolExecutor(HEDGE_WORKERS) if hedge else None
+        self._filters = {}  # filter id -> (endpoint, id on that node)
+
+    def _score(self, endpoint):
+        if self.strategy == STRATEGY_LATENCY:
+            return (endpoint.latency or 0) * (endpoint.outstanding + 1)
+        return endpoint.outstanding, endpoint.latency or 0
+
+    def _candidates(self):
+        '''
+        Return the endpoints in the order they should be tried
+        '''
+        now = time.time()
+        if now - self._last_check > self.check_interval:
+            # checked in the background so no request waits for slow nodes
+            self._last_check = now
+            thread = threading.Thread(target=self.check_lag)
+            thread.daemon = True
+            thread.start()
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.healthy(now)]
+            # with no healthy node left, try them all rather than fail outright
+            return sorted(healthy or self.endpoints, key=self._score)
+
+    def check_lag(self):
+        '''
+        Fetch every node's block number and flag the nodes lagging more than
+        max_lag blocks behind the best one. Nodes cooling down after a
+        failure are not asked. Only one thread runs the check at a time;
+        others keep routing with the previous result.
+        '''
+        if not self._check_lock.acquire(False):
+            return
+        try:
+            now = self._last_check = time.time()
+            for endpoint in self.endpoints:
+                if now < endpoint.unhealthy_until:
+                    endpoint.block_number = None
+                    continue
+                try:
+                    endpoint.block_number = endpoint.client.eth_blockNumber()
+                except EthJsonRpcError:
+                    endpoint.block_number = None
+                    self._mark_unhealthy(endpoint)
+            numbers = [e.block_number for e in self.endpoints if e.block_number is not None]
+            best = max(numbers) if numbers else None
+            with self._lock:
+                for endpoint in self.endpoints:
+                    endpoint.lagging = (best is not None and endpoint.block_number is not None and
+                                        best - endpoint.block_number > self.max_lag)
+        finally:
+            self._check_lock.release()
+
+    def _mark_unhealthy(self, endpoint):
+        with self._lock:
+            endpoint.unhealthy_until = time.time() + self.cooldown
+
+    def _post_to(self, endpoint, data, stream=False):
+        with self._lock:
+            endpoint.outstanding += 1
+        start = time.time()
+        try:
+            r = endpoint.client._http_post(data, stream=stream)
+        except (ConnectionError, BadStatusCodeError):
+            self._mark_unhealthy(endpoint)
+            raise
+        finally:
+            with self._lock:
+                endpoint.outstanding -= 1
+        elapsed = time.time() - start
+        with self._lock:
+            if endpoint.latency is None:
+                endpoint.latency = elapsed
+            else:
+                endpoint.latency += EWMA_ALPHA * (elapsed - endpoint.latency)
+            self._latencies.append(elapsed)
+        return r
+
+    def _hedge_delay(self, data):
+        '''
+        Return how long to wait before hedging this request, or None if it
+        must not be hedged
+        '''
+        if not self.hedge:
+            return None
+        requests = data if isinstance(data, list) else [data]
+        if not all(request['method'] in HEDGED_METHODS for request in requests):
+            return None
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, len(latencies) * self.hedge_percentile // 100)]
+
+    def _post_into(self, future, endpoint, data):
+        try:
+            future.set_result(self._post_to(endpoint, data))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _hedged_post(self, primary, secondary, data, delay, tried):
+        '''
+        Post to primary and, if it has not answered after delay seconds, to
+        secondary as well, and return the first answer and the endpoint that
+        gave it. The primary starts at once on its own thread rather than
+        waiting for an executor worker, so time spent queueing is not
+        mistaken for a slow node. The endpoints actually posted to are
+        appended to tried.
+        '''
+        first = Future()
+        thread = threading.Thread(target=self._post_into, args=(first, primary, data))
+        thread.daemon = True
+        tried.append(primary)
+        thread.start()
+        futures = {first: primary}
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            with self._lock:
+                self.hedges += 1
+            tried.append(secondary)
+            futures[self._executor.submit(self._post_to, secondary, data)] = secondary
+        error = None
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                endpoint = futures.pop(future)
+                try:
+                    return endpoint, future.result()
+                except (ConnectionError, BadStatusCodeError) as e:
+                    error = e
+        raise error
+
+    def _route(self, data, stream=False):
+        '''
+        Post data to the best node, failing over as described above, and
+        return the node and its response
+        '''
+        candidates = self._candidates()
+        delay = None if stream else self._hedge_delay(data)
+        error = None
+        if delay is not None and len(candidates) > 1:
+            tried = []
+            try:
+                return self._hedged_post(candidates[0], candidates[1], data, delay, tried)
+            except (ConnectionError, BadStatusCodeError) as e:
+                error = e
+                # a primary failing before the hedge was sent leaves the secondary untried
+                candidates = [e for e in candidates if e not in tried]
+        requests = data if isinstance(data, list) else [data]
+        if all(request['method'] in READ_ONLY_METHODS for request in requests):
+            errors = (ConnectionError, BadStatusCodeError)
+        else:
+            # a request the node may have acted on must not be sent again
+            errors = ConnectError
+        for endpoint in candidates:
+            try:
+                return endpoint, self._post_to(endpoint, data, stream=stream)
+            except errors as e:
+                error = e
+        raise error
+
+    def _transport(self, data, stream=False):
+        return self._route(data, stream=stream)[1]
+
+    def _post(self, data):
+        requests = data if isinstance(data, list) else [data]
+        if not any(r['method'] in FILTER_INSTALL_METHODS or r['method'] in FILTER_METHODS for r in requests):
+            return EthJsonRpc._post(self, data)
+        # one post per node holding filters named in the request(s), one
+        # more for the rest
+        groups = OrderedDict()
+        with self._lock:
+            for request in requests:
+                endpoint, sent = None, request
+                pinned = self._filters.get(request['params'][0]) if request['method'] in FILTER_METHODS else None
+                if pinned is not None:
+                    endpoint, filter_id = pinned
+                    sent = dict(request, params=[filter_id] + request['params'][1:])
+                groups.setdefault(endpoint, []).append((request, sent))
+        responses = []
+        for endpoint, group in groups.items():
+            payload = [sent for _, sent in group]
+            if not isinstance(data, list):
+                payload = payload[0]
+            if endpoint is None:
+                endpoint, r = self._limited(lambda: self._route(payload), payload)
+            else:
+                r = self._limited(lambda: self._post_to(endpoint, payload), payload)
+            try:
+                response = self.codec.loads(r.content)
+            except ValueError:
+                raise BadJsonError(r.text)
+            response = response if isinstance(response, list) else [response]
+            self._track_filters(endpoint, group, response)
+            responses.extend(response)
+        return responses if isinstance(data, list) else responses[0]
+
+    def _track_filters(self, endpoint, group, responses):
+        '''
+        Pin the filters installed by the requests in group to endpoint, and
+        unpin those uninstalled or no longer known to their node
+        '''
+        by_id = dict((r.get('id'), r) for r in responses if isinstance(r, dict))
+        with self._lock:
+            for request, _ in group:
+                response = by_id.get(request['id'], {})
+                method = request['method']
+                if method in FILTER_INSTALL_METHODS and 'result' in response:
+                    filter_id = response['result']
+                    while filter_id in self._filters:
+                        filter_id = '0x' + os.urandom(16).encode('hex')
+                    self._filters[filter_id] = (endpoint, response['result'])
+                    response['result'] = filter_id
+                elif method in FILTER_METHODS:
+                    error = response.get('error')
+                    message = (error.get('message') if isinstance(error, dict) else None) or ''
+                    if method == 'eth_uninstallFilter' or FILTER_NOT_FOUND in message.lower():
+                        self._filters.pop(request['params'][0], None)
+
+
+class MultiParityEthJsonRpc(MultiEthJsonRpc, ParityEthJsonRpc):
+    '''
+    MultiEthJsonRpc subclass for Parity-specific methods
+    '''
+    pass
@@ -0,0 +1,281 @@
+import threading
+import time
+from collections import OrderedDict
+
+from ethjsonrpc.chain import ChainTracker, REORG_DEPTH
+from ethjsonrpc.models import Log
+from ethjsonrpc.exceptions import EthJsonRpcError
+
+FILTER_MIN_INTERVAL = 0.5  # seconds
+FILTER_MAX_INTERVAL = 8  # seconds
+FILTER_BACKOFF = 1.5
+FILTER_NOT_FOUND = 'filter not found'
+
+KIND_HEADS = 'heads'
+KIND_LOGS = 'logs'
+KIND_PENDING = 'pending'
+
+
+class ManagedFilter(object):
+    '''
+    A filter installed on the node by a FilterPoller. `callback(added,
+    removed)` is called from the poller's loop with new items and, for log
+    filters, the logs of blocks dropped by a reorg (with removed=True).
+    '''
+
+    def __init__(self, kind, callback=None, address=None, topics=None):
+        self.kind = kind
+        self.callback = callback
+        self.address = address
+        self.topics = topics
+        self.filter_id = None
+        self.installs = 0
+        self.interval = None
+        self.next_poll = 0
+        self.checked_block = None  # head when the filter was last polled
+        self.emitted = OrderedDict()  # block hash -> logs, for log filters
+
+    def __repr__(self):
+        return '<ManagedFilter {} {}>'.format(self.kind, self.filter_id)
+
+
+class FilterPoller(object):
+    '''
+    Polls any number of filters from one loop, fetching the changes of all
+    filters that are due in a single batch. A filter is polled more often
+    while it has changes and backs off towards max_interval while it has
+    none. Filters the node dropped are installed again, and log filters
+    then fetch the logs they may have missed with eth_getLogs, so logs are
+    delivered at least once.
+
+    New blocks are tracked with one block filter shared by all block
+    subscribers, comparing parent hashes to notice reorgs; logs already
+    delivered from blocks that a reorg drops are delivered again as
+    removed.
+
+    Use it as a context manager, or call stop(), so the filters are
+    uninstalled even if the consumer fails.
+    '''
+
+    def __init__(self, client, min_interval=FILTER_MIN_INTERVAL, max_interval=FILTER_MAX_INTERVAL,
+                 reorg_depth=REORG_DEPTH):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.tracker = ChainTracker(reorg_depth)
+        self.filters = []
+        self.block_callbacks = []
+        self._heads = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _add(self, managed):
+        managed.interval = self.min_interval
+        with self._lock:
+            self.filters.append(managed)
+        return managed
+
+    def _ensure_heads(self):
+        with self._lock:
+            if self._heads is None:
+                self._heads = ManagedFilter(KIND_HEADS)
+                self._heads.interval = self.min_interval
+                self.filters.append(self._heads)
+
+    def add_log_filter(self, callback, address=None, topics=None):
+        self._ensure_heads()
+        return self._add(ManagedFilter(KIND_LOGS, callback, address, topics))
+
+    def add_block_filter(self, callback):
+        '''
+        Call callback(added, removed) with the hashes of new blocks and of
+        blocks dropped by a reorg
+        '''
+        self._ensure_heads()
+        with self._lock:
+            self.block_callbacks.append(callback)
+        return callback
+
+    def add_pending_filter(self, callback):
+        return self._add(ManagedFilter(KIND_PENDING, callback))
+
+    def remove(self, managed):
+        with self._lock:
+            if managed in self.block_callbacks:
+                self.block_callbacks.remove(managed)
+                return
+            self.filters.remove(managed)
+        self._uninstall([managed])
+
+    def _uninstall(self, filters):
+        batch = self.client.batch()
+        for managed in filters:
+            if managed.filter_id is not None:
+                batch._call('eth_uninstallFilter', [managed.filter_id])
+                managed.filter_id = None
+        try:
+            batch.send()
+        except EthJsonRpcError:
+            # the node drops filters nobody polls anyway
+            pass
+
+    def _install(self, filters):
+        batch = self.client.batch()
+        calls = []
+        for managed in filters:
+            if managed.kind == KIND_HEADS:
+                calls.append(batch.eth_newBlockFilter())
+            elif managed.kind == KIND_PENDING:
+                calls.append(batch.eth_newPendingTransactionFilter())
+            else:
+                calls.append(batch.eth_newFilter(address=managed.address, topics=managed.topics))
+        batch.send()
+        for managed, call in zip(filters, calls):
+            managed.filter_id = call.result()
+            managed.installs += 1
+
+    def _backfill(self, managed):
+        '''
+        Fetch the logs a re-installed log filter may have missed
+        '''
+        if managed.checked_block is None or self.tracker.head is None:
+            return []
+        _filter = {'fromBlock': hex(managed.checked_block + 1), 'toBlock': hex(self.tracker.head)}
+        if managed.address is not None:
+            _filter['address'] = managed.address
+        if managed.topics is not None:
+            _filter['topics'] = managed.topics
+        return self.client._call('eth_getLogs', [_filter])
+
+    def _fetch_block(self, number):
+        return self.client._call('eth_getBlockByNumber', [hex(number), False])
+
+    def _new_heads(self, hashes):
+        '''
+        Track the blocks with these hashes and return the hashes of the
+        blocks dropped by reorgs
+        '''
+        batch = self.client.batch()
+        calls = [batch._call('eth_getBlockByHash', [block_hash, False]) for block_hash in hashes]
+        batch.send()
+        blocks = [call.result() for call in calls]
+        removed = []
+        for block in sorted((b for b in blocks if b is not None), key=lambda b: int(b['number'], 16)):
+            removed.extend(self.tracker.add(block, self._fetch_block))
+        return removed
+
+    def _log_changes(self, managed, logs, dropped):
+        typed = self.client._typed(Log) or (lambda log: log)
+        added, removed = [], []
+        for block_hash in dropped:
+            for log in managed.emitted.pop(block_hash, []):
+                removed.append(typed(dict(log, removed=True)))
+        for log in logs:
+            if log.get('removed'):
+                # the node reports the reorg itself; skip what was reported already
+                if managed.emitted.pop(log['blockHash'], None) is not None:
+                    removed.append(typed(log))
+            else:
+                managed.emitted.setdefault(log['blockHash'], []).append(log)
+                added.append(typed(log))
+        while len(managed.emitted) > self.tracker.depth:
+            managed.emitted.popitem(last=False)
+        return added, removed
+
+    def poll(self):
+        '''
+        Poll the filters that are due and return the number of seconds until
+        the next one is
+        '''
+        now = time.time()
+        with self._lock:
+            filters = list(self.filters)
+            block_callbacks = list(self.block_callbacks)
+        due = [f for f in filters if f.next_poll <= now]
+        # new blocks are needed to tell which delivered logs a reorg dropped
+        if self._heads is not None and self._heads not in due and any(f.kind == KIND_LOGS for f in due):
+            due.append(self._heads)
+        if not due:
+            return max(0, min(f.next_poll for f in filters) - now) if filters else self.max_interval
+
+        reinstalled = [f for f in due if f.filter_id is None and f.installs]
+        self._install([f for f in due if f.filter_id is None])
+
+        batch = self.client.batch()
+        calls = [batch._call('eth_getFilterChanges', [f.filter_id]) for f in due]
+        batch.send()
+        changes = {}
+        for managed, call in zip(due, calls):
+            try:
+                changes[managed] = call.result() or []
+            except EthJsonRpcError as e:
+                if FILTER_NOT_FOUND not in str(e).lower():
+                    raise
+                managed.filter_id = None
+                changes[managed] = []
+
+        dropped = []
+        if changes.get(self._heads):
+            dropped = self._new_heads(changes[self._heads])
+            for callback in block_callbacks:
+                callback(changes[self._heads], dropped)
+
+        for managed in due:
+            items = changes[managed]
+            if managed in reinstalled and managed.kind == KIND_LOGS:
+                items = self._backfill(managed) + items
+            if managed.kind == KIND_LOGS:
+                added, removed = self._log_changes(managed, items, dropped)
+            else:
+                added, removed = items, []
+            if managed.callback is not None and (added or removed):
+                managed.callback(added, removed)
+            if managed.filter_id is None:
+                # dropped by the node, install it again right away
+                managed.next_poll = 0
+                continue
+            managed.checked_block = self.tracker.head
+            if items:
+                managed.interval = max(self.min_interval, managed.interval / 2.0)
+            else:
+                managed.interval = min(self.max_interval, managed.interval * FILTER_BACKOFF)
+            managed.next_poll = now + managed.interval
+        return max(0, min(f.next_poll for f in filters) - time.time())
+
+    def run(self):
+        '''
+        Poll until stop() is called. Errors talking to the node are retried
+        after min_interval.
+        '''
+        while not self._stop.is_set():
+            try:
+                delay = self.poll()
+            except EthJsonRpcError:
+                delay = self.min_interval
+            self._stop.wait(delay)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        '''
+        Stop polling and uninstall all filters
+        '''
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        with self._lock:
+            filters = list(self.filters)
+        self._uninstall(filters)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
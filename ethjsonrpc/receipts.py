@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+
+from concurrent.futures import Future, TimeoutError, as_completed
+
+from ethjsonrpc.models import Receipt
+from ethjsonrpc.exceptions import EthJsonRpcError
+
+RECEIPT_POLL_INTERVAL = 1  # seconds
+
+
+class ReceiptWaiter(object):
+    '''
+    Waits for the receipts of many transactions from one background thread.
+    Every poll_interval seconds it checks the block number, and only when a
+    new block has arrived does it ask for the receipts still missing, all in
+    one batch. Errors talking to the node, for the whole batch or a single
+    receipt, are retried until the timeout.
+
+    `futures` maps each transaction hash to a future of its receipt, which
+    fails with concurrent.futures.TimeoutError if there is still no receipt
+    after timeout seconds. Iterating the waiter yields (hash, receipt) pairs
+    as the receipts arrive.
+    '''
+
+    def __init__(self, client, tx_hashes, timeout=None, poll_interval=RECEIPT_POLL_INTERVAL):
+        self.client = client
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.futures = OrderedDict((tx_hash, Future()) for tx_hash in tx_hashes)
+        self._hashes = dict((future, tx_hash) for tx_hash, future in self.futures.items())
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _pending(self):
+        return [tx_hash for tx_hash, future in self.futures.items() if not future.done()]
+
+    def _poll(self, pending):
+        batch = self.client.batch()
+        calls = [(tx_hash, batch._call('eth_getTransactionReceipt', [tx_hash])) for tx_hash in pending]
+        batch.send()
+        typed = self.client._typed(Receipt)
+        for tx_hash, call in calls:
+            future = self.futures[tx_hash]
+            try:
+                receipt = call.result()
+            except EthJsonRpcError:
+                # often transient (such as a load-balanced node that is a
+                # block behind); asked again with the next block
+                continue
+            if receipt is not None and not future.done():
+                future.set_result(typed(receipt) if typed is not None else receipt)
+
+    def _run(self):
+        deadline = None if self.timeout is None else time.time() + self.timeout
+        block = None
+        while True:
+            pending = self._pending()
+            if not pending:
+                return
+            try:
+                number = self.client.eth_blockNumber()
+                if number != block:
+                    self._poll(pending)
+                    block = number
+            except EthJsonRpcError:
+                pass
+            pending = self._pending()
+            if not pending:
+                return
+            if deadline is not None and time.time() >= deadline:
+                for tx_hash in pending:
+                    self.futures[tx_hash].set_exception(TimeoutError('no receipt for {}'.format(tx_hash)))
+                return
+            delay = self.poll_interval
+            if deadline is not None:
+                delay = min(delay, max(0, deadline - time.time()))
+            time.sleep(delay)
+
+    def cancel(self, tx_hashes=None):
+        '''
+        Stop waiting for some (or all) of the transactions
+        '''
+        for tx_hash in self.futures if tx_hashes is None else tx_hashes:
+            future = self.futures[tx_hash]
+            # a cancelled future only counts as completed once notified
+            if future.cancel():
+                future.set_running_or_notify_cancel()
+
+    def __iter__(self):
+        for future in as_completed(self.futures.values()):
+            if not future.cancelled():
+                yield self._hashes[future], future.result()
+
+    def receipts(self):
+        '''
+        Wait for all receipts and return them as a dict by transaction hash
+        '''
+        return dict(self)
@@ -0,0 +1,81 @@
+import random
+import time
+
+from ethjsonrpc.constants import READ_ONLY_METHODS
+from ethjsonrpc.exceptions import ConnectionError, BadStatusCodeError, BadResponseError
+
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 0.1  # seconds
+RETRY_MAX_BACKOFF = 10  # seconds
+RETRY_DEADLINE = 60  # seconds
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+# JSON-RPC errors from a node (or a node behind a load balancer) that has not
+# caught up with the block being asked for yet
+RETRY_ERROR_MESSAGES = ('header not found', 'unknown block')
+
+
+class RetryPolicy(object):
+    '''
+    Retries transient failures of idempotent calls with exponential backoff
+    and full jitter: attempt n sleeps a random time of up to
+    backoff * 2**n seconds, capped at max_backoff. A call is given up after
+    max_attempts attempts, or when the next sleep would end past `deadline`
+    seconds from the first attempt.
+
+    Connection errors and timeouts, the HTTP status codes in status_codes
+    and JSON-RPC errors containing one of error_messages are retried. Only
+    calls whose methods are all in `methods` are retried.
+    '''
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, backoff=RETRY_BACKOFF, max_backoff=RETRY_MAX_BACKOFF,
+                 deadline=RETRY_DEADLINE, status_codes=RETRY_STATUS_CODES, error_messages=RETRY_ERROR_MESSAGES,
+                 methods=READ_ONLY_METHODS):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.status_codes = status_codes
+        self.error_messages = error_messages
+        self.methods = methods
+        self.retries = 0
+
+    def idempotent(self, data):
+        requests = data if isinstance(data, list) else [data]
+        return all(request['method'] in self.methods for request in requests)
+
+    def retryable(self, e):
+        if isinstance(e, ConnectionError):
+            return True
+        if isinstance(e, BadStatusCodeError):
+            return bool(e.args) and e.args[0] in self.status_codes
+        if isinstance(e, BadResponseError):
+            response = e.args[0] if e.args else None
+            error = response.get('error') if isinstance(response, dict) else None
+            message = (error.get('message') if isinstance(error, dict) else None) or ''
+            return any(m in message.lower() for m in self.error_messages)
+        return False
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def call(self, fn, data):
+        '''
+        Return fn(), retrying it while it fails with a retryable error if the
+        request(s) in data are idempotent
+        '''
+        if not self.idempotent(data):
+            return fn()
+        deadline = time.time() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except (ConnectionError, BadStatusCodeError, BadResponseError) as e:
+                attempt += 1
+                if attempt >= self.max_attempts or not self.retryable(e):
+                    raise
+                delay = self.delay(attempt)
+                if time.time() + delay > deadline:
+                    raise
+                self.retries += 1
+                time.sleep(delay)
@@ -0,0 +1,176 @@
+from Queue import Queue
+
+from ethjsonrpc.client import EthJsonRpc, ParityEthJsonRpc
+from ethjsonrpc.models import Block, Log
+from ethjsonrpc.transport import IpcTransport, WebSocketTransport
+from ethjsonrpc.exceptions import BadResponseError
+
+GETH_DEFAULT_WS_PORT = 8546
+PARITY_DEFAULT_WS_PORT = 8546
+
+END = object()
+
+
+class Subscription(object):
+    '''
+    Notifications of an eth_subscribe subscription. Iterating yields them in
+    the order the node sent them, blocking until the next one arrives; it
+    ends after unsubscribe() and raises ConnectionError if the connection
+    is lost.
+    '''
+
+    def __init__(self, client, item_fn=None):
+        self.client = client
+        self.item_fn = item_fn
+        self.id = None
+        self._queue = Queue()
+
+    def push(self, item):
+        self._queue.put((item, None))
+
+    def end(self, error=None):
+        self._queue.put((END, error))
+
+    def __iter__(self):
+        while True:
+            item, error = self._queue.get()
+            if item is END:
+                if error is not None:
+                    raise error
+                return
+            if self.item_fn is not None:
+                item = self.item_fn(item)
+            yield item
+
+    def unsubscribe(self):
+        self.client.eth_unsubscribe(self.id)
+        self.end()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.unsubscribe()
+
+    def __repr__(self):
+        return '<Subscription {}>'.format(self.id)
+
+
+class SocketEthJsonRpc(EthJsonRpc):
+    '''
+    EthJsonRpc over a persistent socket transport, which also supports
+    eth_subscribe. Subclasses set self.transport.
+    '''
+
+    transport = None
+
+    def _post(self, data):
+        return self._limited(lambda: self.transport.request(data), data)
+
+    def _stream(self, method, params=None, _id=1, item_fn=None):
+        # responses arrive as whole messages, so there is nothing to gain
+        # from parsing them incrementally
+        for item in self._send(method, params or [], _id) or []:
+            if item_fn is not None:
+                item = item_fn(item)
+            yield item
+
+    def close(self):
+        self.transport.close()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _subscribe(self, params, item_fn=None):
+        subscription = Subscription(self, item_fn)
+        data = self._request('eth_subscribe', params)
+        response = self._limited(lambda: self.transport.request(data, subscription=subscription), data)
+        try:
+            subscription.id = response['result']
+        except KeyError:
+            raise BadResponseError(response)
+        return subscription
+
+    def eth_subscribe(self, subscription_type, *params):
+        '''
+        https://geth.ethereum.org/docs/rpc/pubsub
+
+        Returns a Subscription yielding the raw notifications
+        '''
+        return self._subscribe([subscription_type] + list(params))
+
+    def eth_unsubscribe(self, subscription_id):
+        '''
+        https://geth.ethereum.org/docs/rpc/pubsub
+        '''
+        self.transport.forget(subscription_id)
+        return self._call('eth_unsubscribe', [subscription_id])
+
+    def subscribe_new_heads(self):
+        '''
+        Subscribe to the headers of new blocks (including blocks of a reorg)
+        '''
+        return self._subscribe(['newHeads'], item_fn=self._typed(Block))
+
+    def subscribe_logs(self, address=None, topics=None):
+        '''
+        Subscribe to the logs of new blocks matching address and topics. Logs
+        of blocks dropped in a reorg are sent again with removed=True.
+        '''
+        params = {}
+        if address is not None:
+            params['address'] = address
+        if topics is not None:
+            params['topics'] = topics
+        return self._subscribe(['logs', params], item_fn=self._typed(Log))
+
+    def subscribe_pending_transactions(self):
+        '''
+        Subscribe to the hashes of transactions entering the node's pool
+        '''
+        return self._subscribe(['newPendingTransactions'])
+
+
+class WebSocketEthJsonRpc(SocketEthJsonRpc):
+    '''
+    EthJsonRpc over WebSocket (requires websocket-client)
+    '''
+
+    def __init__(self, host='localhost', port=GETH_DEFAULT_WS_PORT, tls=False, **kwargs):
+        EthJsonRpc.__init__(self, host=host, port=port, tls=tls, **kwargs)
+        scheme = 'ws'
+        if self.tls:
+            scheme += 's'
+        self.url = '{}://{}:{}'.format(scheme, self.host, self.port)
+        self.transport = WebSocketTransport(self.url, self.codec, self.timeout)
+
+
+class IpcEthJsonRpc(SocketEthJsonRpc):
+    '''
+    EthJsonRpc over the IPC socket of a node on the same machine
+    '''
+
+    def __init__(self, path, **kwargs):
+        EthJsonRpc.__init__(self, **kwargs)
+        self.url = path
+        self.transport = IpcTransport(path, self.codec, self.timeout)
+
+
+class WebSocketParityEthJsonRpc(WebSocketEthJsonRpc, ParityEthJsonRpc):
+    '''
+    WebSocketEthJsonRpc subclass for Parity-specific methods
+    '''
+
+    def __init__(self, host='localhost', port=PARITY_DEFAULT_WS_PORT, tls=False, **kwargs):
+        WebSocketEthJsonRpc.__init__(self, host=host, port=port, tls=tls, **kwargs)
+
+
+class IpcParityEthJsonRpc(IpcEthJsonRpc, ParityEthJsonRpc):
+    '''
+    IpcEthJsonRpc subclass for Parity-specific methods
+    '''
+    pass
@@ -0,0 +1,74 @@
+import json
+import sqlite3
+import threading
+
+from ethjsonrpc.cache import ResponseCache, MISS, DEFAULT_CONFIRMATIONS, HEAD_TTL
+
+# methods kept on disk, mapped to the index of their block parameter (None if
+# keyed by hash)
+STORED_METHODS = {
+    'eth_getBlockByHash':        None,
+    'eth_getTransactionReceipt': None,
+    'eth_getBlockByNumber':      0,
+    'trace_block':               0,
+}
+
+
+class BlockStore(ResponseCache):
+    '''
+    Persistent SQLite store for final blocks, receipts and trace_block
+    results. EthJsonRpc reads through it, so re-running a job over a
+    historical range is served from disk instead of the node. Each thread
+    uses its own connection and the database runs in WAL mode, so any number
+    of readers can run alongside a writer.
+    '''
+
+    methods = STORED_METHODS
+
+    def __init__(self, path, confirmations=DEFAULT_CONFIRMATIONS, head_ttl=HEAD_TTL):
+        ResponseCache.__init__(self, max_size=None, confirmations=confirmations, head_ttl=head_ttl)
+        self.path = path
+        self._local = threading.local()
+        db = self._db()
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('CREATE TABLE IF NOT EXISTS responses ('
+                   'method TEXT NOT NULL, params TEXT NOT NULL, result TEXT NOT NULL, '
+                   'PRIMARY KEY (method, params))')
+        db.commit()
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30)
+        return db
+
+    def __len__(self):
+        return self._db().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def _load(self, key):
+        row = self._db().execute('SELECT result FROM responses WHERE method = ? AND params = ?', key).fetchone()
+        if row is None:
+            return MISS
+        return json.loads(row[0])
+
+    def _save(self, key, result):
+        db = self._db()
+        db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)', key + (json.dumps(result),))
+        db.commit()
+
+    def clear(self):
+        db = self._db()
+        db.execute('DELETE FROM responses')
+        db.commit()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        '''
+        Close the connection of the calling thread
+        '''
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            db.close()
+            self._local.db = None
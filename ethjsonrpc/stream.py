@@ -0,0 +1,93 @@
+import json
+
+from ethjsonrpc.exceptions import BadJsonError, BadResponseError
+
+STREAM_CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+
+
+class ResultStream(object):
+    '''
+    Incremental parser for a JSON-RPC response read from a sequence of byte
+    chunks. The elements of a "result" array are decoded and yielded one at
+    a time, so only the element being parsed is held in memory.
+    '''
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _read(self):
+        for chunk in self._chunks:
+            if chunk:
+                # drop what has been parsed already before growing the buffer
+                self._buf = self._buf[self._pos:] + chunk
+                self._pos = 0
+                return
+        self._eof = True
+
+    def _peek(self):
+        '''
+        Skip whitespace and return the next character ('' at the end)
+        '''
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf) or self._eof:
+                return self._buf[self._pos:self._pos + 1]
+            self._read()
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char not in chars or not char:
+            raise BadJsonError('expected {!r} at {!r}'.format(chars, self._buf[self._pos:self._pos + 40]))
+        self._pos += 1
+        return char
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                if self._eof:
+                    raise BadJsonError(self._buf[self._pos:self._pos + 40])
+                self._read()
+                continue
+            # a number at the end of the buffer may continue in the next chunk
+            if end == len(self._buf) and not self._eof:
+                self._read()
+                continue
+            self._pos = end
+            return value
+
+    def __iter__(self):
+        response = {}
+        self._expect('{')
+        if self._peek() == '}':
+            raise BadResponseError(response)
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == 'result' and self._peek() == '[':
+                response[key] = True
+                self._pos += 1
+                if self._peek() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._expect(',]') == ']':
+                            break
+            else:
+                response[key] = self._value()
+            if self._expect(',}') == '}':
+                break
+        if 'result' not in response:
+            raise BadResponseError(response)
+        if isinstance(response['result'], list):
+            for item in response['result']:
+                yield item
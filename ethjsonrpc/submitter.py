@@ -0,0 +1,252 @@
+import heapq
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from ethereum.utils import sha3
+
+from ethjsonrpc.constants import BLOCK_TAG_PENDING
+from ethjsonrpc.receipts import RECEIPT_POLL_INTERVAL
+from ethjsonrpc.exceptions import EthJsonRpcError, ConnectionError, BadResponseError
+
+SUBMIT_WORKERS = 16
+SEND_ATTEMPTS = 3
+# fragments of the errors nodes return when a nonce has been used already,
+# when the very same transaction is already in their pool, when another
+# transaction with the nonce is, and when a transaction is rejected before
+# its nonce is looked at (so the nonce is still free)
+NONCE_TOO_LOW_MESSAGES = ('nonce too low', 'nonce is too low', 'already been used')
+ALREADY_KNOWN_MESSAGES = ('already known', 'known transaction', 'already imported')
+NONCE_TAKEN_MESSAGES = ('replacement', 'same nonce')
+NONCE_UNUSED_MESSAGES = ('insufficient funds', 'intrinsic gas', 'gas limit', 'transaction underpriced',
+                         'fee too low', 'invalid sender', 'oversized data', 'negative value',
+                         'unknown account', 'account locked', 'authentication needed')
+
+
+def _error_message(e):
+    response = e.args[0] if e.args else None
+    error = response.get('error') if isinstance(response, dict) else None
+    return ((error.get('message') if isinstance(error, dict) else None) or '').lower()
+
+
+class NonceManager(object):
+    '''
+    Hands out nonces per account without asking the node every time: the
+    first nonce of an account comes from eth_getTransactionCount(pending),
+    the following ones are counted locally. Nonces of transactions the node
+    rejected are given back with release() and handed out again first, so
+    the gap they leave is filled by the next transaction.
+    '''
+
+    def __init__(self, client):
+        self.client = client
+        self._lock = threading.Lock()
+        self._account_locks = {}
+        self._next = {}
+        self._free = {}
+
+    def _account(self, address):
+        with self._lock:
+            return self._account_locks.setdefault(address.lower(), threading.Lock())
+
+    def next(self, address):
+        key = address.lower()
+        with self._account(address):
+            free = self._free.get(key)
+            if free:
+                return heapq.heappop(free)
+            if key not in self._next:
+                self._next[key] = self.client.eth_getTransactionCount(address, BLOCK_TAG_PENDING)
+            nonce = self._next[key]
+            self._next[key] += 1
+            return nonce
+
+    def release(self, address, nonce):
+        '''
+        Give back a nonce that did not end up in a transaction
+        '''
+        with self._account(address):
+            heapq.heappush(self._free.setdefault(address.lower(), []), nonce)
+
+    def gaps(self, address):
+        '''
+        Return the nonces given back and not handed out again
+        '''
+        with self._account(address):
+            return sorted(self._free.get(address.lower(), []))
+
+    def sync(self, address):
+        '''
+        Catch up with nonces used outside this manager (by another process
+        or a transaction that was sent twice), dropping given back nonces
+        that the node has seen used since
+        '''
+        key = address.lower()
+        count = self.client.eth_getTransactionCount(address, BLOCK_TAG_PENDING)
+        with self._account(address):
+            self._next[key] = max(self._next.get(key, 0), count)
+            free = [nonce for nonce in self._free.get(key, []) if nonce >= count]
+            heapq.heapify(free)
+            self._free[key] = free
+
+
+class SubmittedTransaction(object):
+    '''
+    A transaction sent by a TxSubmitter. hashes holds every hash sent with
+    its nonce (more than one after replace()); receipt is set by wait().
+    '''
+
+    def __init__(self, from_address, params=None, sign=None):
+        self.from_address = from_address
+        self.params = params
+        self.sign = sign
+        self.nonce = None
+        self.hashes = []
+        self.receipt = None
+
+    @property
+    def hash(self):
+        return self.hashes[-1] if self.hashes else None
+
+    def __repr__(self):
+        return '<SubmittedTransaction {} nonce={}>'.format(self.hash, self.nonce)
+
+
+class TxSubmitter(object):
+    '''
+    Sends many transactions concurrently. Nonces are assigned locally in
+    submission order by a NonceManager, so sending never waits for the
+    previous transaction to be accepted.
+
+    submit() sends with eth_sendTransaction from an account the node holds.
+    submit_raw() sends with eth_sendRawTransaction; sign(nonce) must return
+    the signed transaction as a hex string. Both return a future resolving
+    to the SubmittedTransaction.
+
+    A send that fails to connect is repeated with the same nonce; if the
+    node answers that it knows the transaction already, the earlier attempt
+    went through (for eth_sendTransaction its hash is not known then, and
+    wait() cannot fetch its receipt). When the node says the nonce was used
+    already, the nonce is synced with the node and the transaction is sent
+    with a new one. When the node rejects the transaction for a reason that
+    shows the nonce is still free (insufficient funds, gas too low, ...),
+    the nonce is given back to fill the gap with the next transaction (or
+    with fill_gaps()).
+    '''
+
+    def __init__(self, client, max_workers=SUBMIT_WORKERS, nonces=None):
+        self.client = client
+        self.nonces = nonces or NonceManager(client)
+        self.executor = ThreadPoolExecutor(max_workers)
+        self.transactions = []
+        self._lock = threading.Lock()
+
+    def submit(self, from_address, to_address=None, value=None, data=None, gas=None, gas_price=None):
+        params = {'to_address': to_address, 'value': value, 'data': data, 'gas': gas, 'gas_price': gas_price}
+        return self._submit(SubmittedTransaction(from_address, params=params))
+
+    def submit_raw(self, from_address, sign):
+        return self._submit(SubmittedTransaction(from_address, sign=sign))
+
+    def _submit(self, tx):
+        tx.nonce = self.nonces.next(tx.from_address)
+        with self._lock:
+            self.transactions.append(tx)
+        return self.executor.submit(self._send, tx)
+
+    def replace(self, tx, gas_price=None, sign=None):
+        '''
+        Send a replacement for a pending transaction with the same nonce: a
+        node-held account's transaction is sent again with a new gas price,
+        a raw one signed by the new sign function
+        '''
+        if sign is not None:
+            tx.sign = sign
+        else:
+            tx.params = dict(tx.params, gas_price=gas_price)
+        return self.executor.submit(self._send, tx, False)
+
+    def _send_once(self, tx):
+        '''
+        Send the transaction and return its hash, or None if the node already
+        had it in its pool from an attempt whose response got lost and the
+        hash cannot be told
+        '''
+        raw = tx.sign(tx.nonce) if tx.sign is not None else None
+        try:
+            if raw is not None:
+                return self.client.eth_sendRawTransaction(raw)
+            return self.client.eth_sendTransaction(from_address=tx.from_address, nonce=tx.nonce, **tx.params)
+        except BadResponseError as e:
+            if not any(m in _error_message(e) for m in ALREADY_KNOWN_MESSAGES):
+                raise
+            if raw is None:
+                return None
+            return '0x' + sha3((raw[2:] if raw.startswith('0x') else raw).decode('hex')).encode('hex')
+
+    def _send(self, tx, renonce=True):
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                tx_hash = self._send_once(tx)
+                if tx_hash is not None and tx_hash not in tx.hashes:
+                    tx.hashes.append(tx_hash)
+                return tx
+            except ConnectionError:
+                if attempt < SEND_ATTEMPTS:
+                    continue
+                raise
+            except BadResponseError as e:
+                message = _error_message(e)
+                too_low = any(m in message for m in NONCE_TOO_LOW_MESSAGES)
+                if too_low and renonce and attempt < SEND_ATTEMPTS:
+                    self.nonces.sync(tx.from_address)
+                    tx.nonce = self.nonces.next(tx.from_address)
+                    continue
+                # give the nonce back only when the error shows it is unused
+                unused = (not too_low and not any(m in message for m in NONCE_TAKEN_MESSAGES) and
+                          any(m in message for m in NONCE_UNUSED_MESSAGES))
+                if renonce and unused:
+                    self.nonces.release(tx.from_address, tx.nonce)
+                raise
+
+    def fill_gaps(self, address):
+        '''
+        Send a zero-value transaction to itself from a node-held account for
+        every nonce given back, so later transactions are not stuck behind
+        the gaps. Returns the futures of the fillers.
+        '''
+        self.nonces.sync(address)
+        return [self.submit(address, to_address=address, value=0) for _ in self.nonces.gaps(address)]
+
+    def wait(self, timeout=None, poll_interval=RECEIPT_POLL_INTERVAL):
+        '''
+        Wait for the receipts of all submitted transactions, until all have
+        one or timeout seconds have passed. Returns the transactions still
+        without a receipt.
+        '''
+        with self._lock:
+            pending = [tx for tx in self.transactions if tx.receipt is None and tx.hashes]
+        owners = dict((tx_hash, tx) for tx in pending for tx_hash in tx.hashes)
+        if not owners:
+            return []
+        waiter = self.client.wait_for_receipts(list(owners), timeout, poll_interval)
+        try:
+            for tx_hash, receipt in waiter:
+                tx = owners[tx_hash]
+                if tx.receipt is None:
+                    tx.receipt = receipt
+                    # a replaced transaction has its receipt under one hash only
+                    waiter.cancel(tx.hashes)
+        except (TimeoutError, EthJsonRpcError):
+            waiter.cancel()
+        return [tx for tx in pending if tx.receipt is None]
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,262 @@
+import itertools
+import json
+import socket
+import threading
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+from ethjsonrpc.exceptions import ConnectionError, TimeoutError, ConnectError
+
+IPC_CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+
+
+class PendingRequest(object):
+    '''
+    A request (or batch) sent over a SocketTransport and not answered yet.
+    ids maps the ids it was sent with to the caller's ids.
+    '''
+
+    __slots__ = ('ids', 'subscription', 'done', 'response', 'error')
+
+    def __init__(self, ids, subscription=None):
+        self.ids = ids
+        self.subscription = subscription
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class SocketTransport(object):
+    '''
+    Persistent connection shared by any number of threads. Requests are
+    sent with ids unique on the connection, and a reader thread matches
+    responses to them and routes eth_subscription notifications to their
+    subscription. The connection is opened on first use and reopened on the
+    next request after it is lost; subscriptions do not survive that.
+    '''
+
+    errors = (socket.error, EnvironmentError)
+
+    def __init__(self, codec, timeout=None):
+        self.codec = codec
+        # (connect, read) like requests, or one value for both
+        self.connect_timeout, self.read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._pending = {}
+        self._subscriptions = {}
+        self._connection = 0  # incremented on every (re)connect
+        self._connected = False
+
+    def _connect(self):
+        raise NotImplementedError
+
+    def _disconnect(self):
+        raise NotImplementedError
+
+    def _write(self, payload):
+        raise NotImplementedError
+
+    def _messages(self):
+        '''
+        Yield the messages received until the connection is closed
+        '''
+        raise NotImplementedError
+
+    def _ensure_connected(self):
+        with self._lock:
+            if self._connected:
+                return
+            try:
+                self._connect()
+            except self.errors as e:
+                raise ConnectError(e)
+            self._connected = True
+            self._connection += 1
+            reader = threading.Thread(target=self._read_loop, args=(self._connection,))
+            reader.daemon = True
+            reader.start()
+
+    def _read_loop(self, connection):
+        error = ConnectionError('connection closed')
+        try:
+            for message in self._messages():
+                self._dispatch(message)
+        except Exception as e:
+            error = ConnectionError(e)
+        finally:
+            self._close(error, connection)
+
+    def _dispatch(self, message):
+        if isinstance(message, dict) and message.get('method') == 'eth_subscription':
+            params = message.get('params') or {}
+            with self._lock:
+                subscription = self._subscriptions.get(params.get('subscription'))
+            if subscription is not None:
+                subscription.push(params.get('result'))
+            return
+        responses = message if isinstance(message, list) else [message]
+        if not responses or not isinstance(responses[0], dict):
+            return
+        with self._lock:
+            pending = self._pending.get(responses[0].get('id'))
+            if pending is None:
+                return
+            for _id in pending.ids:
+                self._pending.pop(_id, None)
+            # register before any notification for it can be read
+            if pending.subscription is not None and 'result' in message:
+                self._subscriptions[message['result']] = pending.subscription
+        for response in responses:
+            if response.get('id') in pending.ids:
+                response['id'] = pending.ids[response['id']]
+        pending.response = message
+        pending.done.set()
+
+    def request(self, data, subscription=None):
+        '''
+        Send a request or a batch and return the decoded response. If
+        subscription is given, notifications for the subscription id the
+        request returns are pushed to it.
+        '''
+        self._ensure_connected()
+        requests = data if isinstance(data, list) else [data]
+        sent = [dict(request, id=next(self._ids)) for request in requests]
+        pending = PendingRequest(dict((s['id'], r.get('id')) for s, r in zip(sent, requests)), subscription)
+        with self._lock:
+            for _id in pending.ids:
+                self._pending[_id] = pending
+        try:
+            with self._send_lock:
+                self._write(self.codec.dumps(sent if isinstance(data, list) else sent[0]))
+        except self.errors as e:
+            self._close(ConnectionError(e))
+        if not pending.done.wait(self.read_timeout):
+            with self._lock:
+                for _id in pending.ids:
+                    self._pending.pop(_id, None)
+            raise TimeoutError
+        if pending.error is not None:
+            raise pending.error
+        return pending.response
+
+    def forget(self, subscription_id):
+        with self._lock:
+            return self._subscriptions.pop(subscription_id, None)
+
+    def _close(self, error, connection=None):
+        with self._lock:
+            # a reader of an earlier connection must not close the current one
+            if not self._connected or (connection is not None and connection != self._connection):
+                return
+            self._connected = False
+            pending, self._pending = self._pending, {}
+            subscriptions, self._subscriptions = self._subscriptions, {}
+            try:
+                self._disconnect()
+            except self.errors:
+                pass
+        for request in set(pending.values()):
+            request.error = error
+            request.done.set()
+        for subscription in subscriptions.values():
+            subscription.end(error)
+
+    def close(self):
+        self._close(ConnectionError('connection closed'))
+
+
+class IpcTransport(SocketTransport):
+    '''
+    Transport over the Unix domain socket of a local node (such as
+    ~/.ethereum/geth.ipc)
+    '''
+
+    def __init__(self, path, codec, timeout=None):
+        SocketTransport.__init__(self, codec, timeout)
+        self.path = path
+        self._sock = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.connect_timeout)
+        sock.connect(self.path)
+        sock.settimeout(None)
+        self._sock = sock
+
+    def _disconnect(self):
+        try:
+            # wakes up the reader blocked in recv
+            self._sock.shutdown(socket.SHUT_RDWR)
+        finally:
+            self._sock.close()
+
+    def _write(self, payload):
+        self._sock.sendall(payload)
+
+    def _messages(self):
+        # messages are JSON documents written back to back, so they are cut
+        # out of the byte stream by parsing
+        sock = self._sock
+        decoder = json.JSONDecoder()
+        buf = ''
+        while True:
+            chunk = sock.recv(IPC_CHUNK_SIZE)
+            if not chunk:
+                return
+            buf += chunk
+            # only try to parse once the data read so far may end a document
+            if buf.rstrip(WHITESPACE)[-1:] not in ('}', ']'):
+                continue
+            pos = 0
+            while True:
+                while pos < len(buf) and buf[pos] in WHITESPACE:
+                    pos += 1
+                if pos == len(buf):
+                    break
+                try:
+                    message, pos = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    break
+                yield message
+            buf = buf[pos:]
+
+
+class WebSocketTransport(SocketTransport):
+    '''
+    Transport over a WebSocket connection (requires websocket-client)
+    '''
+
+    errors = SocketTransport.errors + ((websocket.WebSocketException,) if websocket is not None else ())
+
+    def __init__(self, url, codec, timeout=None):
+        if websocket is None:
+            raise RuntimeError('websocket-client is required for WebSocket transport')
+        SocketTransport.__init__(self, codec, timeout)
+        self.url = url
+        self._ws = None
+
+    def _connect(self):
+        self._ws = websocket.create_connection(self.url, timeout=self.connect_timeout)
+        self._ws.settimeout(None)
+
+    def _disconnect(self):
+        # wakes up the reader blocked in recv
+        self._ws.abort()
+        self._ws.shutdown()
+
+    def _write(self, payload):
+        self._ws.send(payload)
+
+    def _messages(self):
+        ws = self._ws
+        while True:
+            message = ws.recv()
+            if not message:
+                return
+            yield self.codec.loads(message)
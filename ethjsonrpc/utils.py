@@ -1,5 +1,23 @@
+from collections import deque
+from decimal import Context, Decimal
+
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from ethjsonrpc.constants import BLOCK_TAGS
 
+UNITS = {
+    'wei':   0,
+    'gwei':  9,
+    'ether': 18,
+}
+# enough precision for any 256-bit amount in any unit, so no rounding happens
+EXACT = Context(prec=100)
+
 
 def hex_to_dec(x):
     '''
@@ -36,3 +54,179 @@ def ether_to_wei(ether):
     Convert ether to wei
     '''
     return ether * 10**18
+
+
+def ordered_map(fn, iterable, concurrency):
+    '''
+    Like map(), but runs fn on up to concurrency items at a time. Results are
+    yielded in input order and at most 2 * concurrency of them are held at
+    once, so new work is only started as the consumer catches up.
+    '''
+    window = deque()
+    items = iter(iterable)
+    with ThreadPoolExecutor(concurrency) as executor:
+        for item in items:
+            window.append(executor.submit(fn, item))
+            if len(window) >= 2 * concurrency:
+                break
+        while window:
+            result = window.popleft().result()
+            for item in items:
+                window.append(executor.submit(fn, item))
+                break
+            yield result
+
+
+if numpy is not None:
+    _HEX_CHARS = numpy.array(list('0123456789abcdef'), dtype='S1')
+
+
+def hex_to_uint64_array(values):
+    '''
+    Convert a sequence of hex quantities of at most 64 bits (block numbers,
+    gas, nonces, timestamps) to a numpy uint64 array; None converts to 0
+    '''
+    if numpy is None:
+        raise RuntimeError('numpy is required for bulk hex conversion')
+    return numpy.fromiter((int(v, 16) if v else 0 for v in values), numpy.uint64, len(values))
+
+
+def hex_to_dec_array(values):
+    '''
+    Convert a sequence of hex quantities of up to 256 bits (balances, wei
+    amounts) to a numpy object array of exact ints; None converts to 0
+    '''
+    if numpy is None:
+        raise RuntimeError('numpy is required for bulk hex conversion')
+    # int() parses a hex string faster than any numpy digit arithmetic
+    result = numpy.empty(len(values), dtype=object)
+    result[:] = [int(v, 16) if v else 0 for v in values]
+    return result
+
+
+def clean_hex_array(values):
+    '''
+    Convert a sequence or array of non-negative ints to a numpy array of hex
+    strings without leading zeros. uint64 arrays are converted with numpy
+    array operations. Raises ValueError for negative values.
+    '''
+    if numpy is None:
+        raise RuntimeError('numpy is required for bulk hex conversion')
+    array = numpy.asarray(values)
+    if array.dtype.kind == 'f' and not isinstance(values, numpy.ndarray):
+        # numpy turns ints beyond int64 mixed with others into floats
+        array = numpy.array(values, dtype=object)
+    values = array
+    if values.dtype.kind not in 'ui':
+        values = [int(v) for v in values]
+        if any(v < 0 for v in values):
+            raise ValueError('negative values cannot be hex quantities')
+        return numpy.array([clean_hex(v) for v in values], dtype='S')
+    if values.dtype.kind == 'i' and (values < 0).any():
+        raise ValueError('negative values cannot be hex quantities')
+    values = values.astype(numpy.uint64)
+    shifts = numpy.arange(60, -4, -4, dtype=numpy.uint64)
+    nibbles = ((values[:, None] >> shifts[None, :]) & numpy.uint64(0xf)).astype(numpy.uint8)
+    digits = numpy.ascontiguousarray(_HEX_CHARS[nibbles]).view('S16').ravel()
+    digits = numpy.char.lstrip(digits, '0')
+    digits[values == 0] = '0'
+    return numpy.char.add('0x', digits)
+
+
+def _as_int(amount):
+    '''
+    Return an int or numpy integer amount as an int, or None for other types
+    '''
+    if isinstance(amount, (int, long)):
+        return amount
+    if isinstance(amount, numpy.integer):
+        return int(amount)
+    return None
+
+
+def _as_decimal(amount):
+    if isinstance(amount, float):
+        amount = repr(amount)
+    return Decimal(amount)
+
+
+def convert_units(amounts, from_unit, to_unit):
+    '''
+    Exactly convert a sequence or array of amounts between 'wei', 'gwei' and
+    'ether'. Integer amounts (numpy integer arrays included) are converted
+    with integer arithmetic: to a smaller unit they become ints, to a larger
+    one Decimals. Other amounts go through Decimal; floats are read from
+    their shortest repr, so 0.1 ether is exactly 10**17 wei. Results in wei
+    are always ints. Returns a numpy object array.
+    '''
+    if numpy is None:
+        raise RuntimeError('numpy is required for bulk unit conversion')
+    shift = UNITS[from_unit] - UNITS[to_unit]
+    if isinstance(amounts, numpy.ndarray) and amounts.dtype.kind in 'ui':
+        amounts = amounts.tolist()
+    factor = 10 ** abs(shift)
+    exponent = 'E{}'.format(shift)
+    values = []
+    for amount in amounts:
+        value = _as_int(amount)
+        if value is not None:
+            if shift >= 0:
+                values.append(value * factor)
+            else:
+                # a Decimal is parsed from its digits; no rounding can happen
+                values.append(Decimal(str(value) + exponent))
+            continue
+        value = EXACT.scaleb(_as_decimal(amount), shift)
+        if to_unit == 'wei':
+            if value != value.to_integral_value():
+                raise ValueError('{} {} is not a whole number of wei'.format(amount, from_unit))
+            value = int(value)
+        values.append(value)
+    result = numpy.empty(len(values), dtype=object)
+    result[:] = values
+    return result
+
+
+def divmod_units(amounts, from_unit, to_unit):
+    '''
+    Split integer amounts (ints or a numpy integer array) into whole amounts
+    of a larger unit and the remainders in the original unit, e.g. wei into
+    whole ether and leftover wei. Returns two numpy object arrays of ints.
+    The fastest exact conversion for millions of values, as no Decimal is
+    created.
+    '''
+    if numpy is None:
+        raise RuntimeError('numpy is required for bulk unit conversion')
+    shift = UNITS[to_unit] - UNITS[from_unit]
+    if shift < 0:
+        raise ValueError('{} is not a larger unit than {}'.format(to_unit, from_unit))
+    if isinstance(amounts, numpy.ndarray) and amounts.dtype.kind in 'ui':
+        amounts = amounts.tolist()
+    factor = 10 ** shift
+    whole = numpy.empty(len(amounts), dtype=object)
+    remainder = numpy.empty(len(amounts), dtype=object)
+    pairs = []
+    for amount in amounts:
+        value = _as_int(amount)
+        if value is None:
+            raise TypeError('{!r} is not an integer amount'.format(amount))
+        pairs.append(divmod(value, factor))
+    whole[:] = [q for q, _ in pairs]
+    remainder[:] = [r for _, r in pairs]
+    return whole, remainder
+
+
+def wei_to_ether_array(wei):
+    return convert_units(wei, 'wei', 'ether')
+
+
+def ether_to_wei_array(ether):
+    return convert_units(ether, 'ether', 'wei')
+
+
+def wei_to_gwei_array(wei):
+    return convert_units(wei, 'wei', 'gwei')
+
+
+def gwei_to_wei_array(gwei):
+    return convert_units(gwei, 'gwei', 'wei')
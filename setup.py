@@ -23,6 +23,11 @@ setup(
     ],
     install_requires=[
         'ethereum==1.0.8',
+        'futures==3.0.5',
         'requests==2.9.1',
     ],
+    extras_require={
+        'export': ['numpy', 'pyarrow'],
+        'websocket': ['websocket-client'],
+    },
 )
@@ -0,0 +1,255 @@
+import json
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from ethjsonrpc import IpcEthJsonRpc, ConnectionError, TimeoutError
+from ethjsonrpc.codec import default_codec
+from ethjsonrpc.transport import IpcTransport
+
+
+class StandInNode(object):
+    '''
+    Node stand-in on a Unix socket. Every request is answered from its own
+    thread after delays[method] seconds (plus up to jitter seconds), so
+    responses come back in any order; batches are answered in reverse.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.delays = {}
+        self.jitter = 0
+        self.requests = []
+        self.connections = []
+        self._locks = {}
+        self._subscriptions = {}
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(5)
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except socket.error:
+                return
+            self.connections.append(conn)
+            self._locks[conn] = threading.Lock()
+            thread = threading.Thread(target=self._serve, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, conn):
+        decoder = json.JSONDecoder()
+        buf = ''
+        while True:
+            try:
+                chunk = conn.recv(4096)
+            except socket.error:
+                return
+            if not chunk:
+                return
+            buf += chunk
+            while buf.strip():
+                buf = buf.lstrip()
+                try:
+                    message, end = decoder.raw_decode(buf)
+                except ValueError:
+                    break
+                buf = buf[end:]
+                thread = threading.Thread(target=self._answer, args=(conn, message))
+                thread.daemon = True
+                thread.start()
+
+    def _answer(self, conn, message):
+        if isinstance(message, list):
+            response = [self._response(conn, request) for request in reversed(message)]
+        else:
+            response = self._response(conn, message)
+        self.send(conn, response)
+
+    def _response(self, conn, request):
+        method, params = request['method'], request.get('params', [])
+        self.requests.append(method)
+        time.sleep(self.delays.get(method, 0) + random.random() * self.jitter)
+        if method == 'eth_blockNumber':
+            result = '0x64'
+        elif method == 'eth_getBalance':
+            result = params[0]
+        elif method == 'eth_subscribe':
+            result = '0x{:x}'.format(len(self._subscriptions) + 1)
+            self._subscriptions[result] = conn
+        elif method == 'eth_unsubscribe':
+            result = self._subscriptions.pop(params[0], None) is not None
+        else:
+            return {'jsonrpc': '2.0', 'id': request['id'], 'error': {'code': -32601, 'message': 'no such method'}}
+        return {'jsonrpc': '2.0', 'id': request['id'], 'result': result}
+
+    def send(self, conn, message):
+        try:
+            with self._locks[conn]:
+                conn.sendall(json.dumps(message) + '\n')
+        except socket.error:
+            pass
+
+    def notify(self, subscription_id, result):
+        message = {'jsonrpc': '2.0', 'method': 'eth_subscription',
+                   'params': {'subscription': subscription_id, 'result': result}}
+        self.send(self._subscriptions[subscription_id], message)
+
+    def drop(self):
+        '''
+        Close all connections, as a node restart would
+        '''
+        for conn in self.connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            conn.close()
+        self.connections = []
+        self._subscriptions = {}
+
+    def close(self):
+        self.drop()
+        self.server.close()
+
+
+class IpcClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.node = StandInNode(os.path.join(self.dir, 'node.ipc'))
+        self.client = IpcEthJsonRpc(self.node.path, timeout=2)
+
+    def tearDown(self):
+        self.client.close()
+        self.node.close()
+        shutil.rmtree(self.dir)
+
+    def test_call(self):
+        self.assertEqual(self.client.eth_blockNumber(), 100)
+
+    def test_caller_ids_are_kept(self):
+        data = {'jsonrpc': '2.0', 'id': 'mine', 'method': 'eth_blockNumber', 'params': []}
+        self.assertEqual(self.client.transport.request(data)['id'], 'mine')
+
+    def test_concurrent_calls_answered_out_of_order(self):
+        self.node.jitter = 0.05
+        results = {}
+
+        def call(i):
+            results[i] = self.client.eth_getBalance('0x{:x}'.format(i))
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(1, 31)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, dict((i, i) for i in range(1, 31)))
+        # all over one connection
+        self.assertEqual(len(self.node.connections), 1)
+
+    def test_batch(self):
+        batch = self.client.batch()
+        calls = [batch.eth_getBalance('0x{:x}'.format(i)) for i in range(1, 6)]
+        batch.send()
+        self.assertEqual([call.result() for call in calls], [1, 2, 3, 4, 5])
+
+    def test_subscription(self):
+        subscription = self.client.subscribe_new_heads()
+        for number in range(3):
+            self.node.notify(subscription.id, {'number': hex(number)})
+        items = iter(subscription)
+        self.assertEqual([next(items)['number'] for _ in range(3)], ['0x0', '0x1', '0x2'])
+        subscription.unsubscribe()
+        self.assertEqual(list(items), [])
+        self.assertIn('eth_unsubscribe', self.node.requests)
+
+    def test_notifications_are_routed_by_subscription(self):
+        heads = self.client.subscribe_new_heads()
+        pending = self.client.subscribe_pending_transactions()
+        self.node.notify(pending.id, '0xaa')
+        self.node.notify(heads.id, {'number': '0x1'})
+        self.assertEqual(next(iter(heads)), {'number': '0x1'})
+        self.assertEqual(next(iter(pending)), '0xaa')
+
+    def test_connection_lost(self):
+        subscription = self.client.subscribe_new_heads()
+        self.node.delays['eth_getBalance'] = 1
+        errors = []
+
+        def call():
+            try:
+                self.client.eth_getBalance('0x1')
+            except ConnectionError as e:
+                errors.append(e)
+        thread = threading.Thread(target=call)
+        thread.start()
+        time.sleep(0.2)
+        self.node.drop()
+        thread.join()
+        # the waiting call and the subscription both learn about it
+        self.assertEqual(len(errors), 1)
+        self.assertRaises(ConnectionError, list, subscription)
+        # and the next call reconnects
+        self.assertEqual(self.client.eth_blockNumber(), 100)
+        self.assertEqual(self.client.transport._connection, 2)
+
+    def test_timeout(self):
+        client = IpcEthJsonRpc(self.node.path, timeout=0.2)
+        self.node.delays['eth_getBalance'] = 0.5
+        self.assertRaises(TimeoutError, client.eth_getBalance, '0x1')
+        # the late answer is dropped and the connection stays usable
+        time.sleep(0.5)
+        self.assertEqual(client.eth_blockNumber(), 100)
+        client.close()
+
+
+class IpcFramingTest(unittest.TestCase):
+    '''
+    The reader cuts messages out of the byte stream however the node's
+    writes are split or joined
+    '''
+
+    def setUp(self):
+        self.transport = IpcTransport(None, default_codec())
+        self.transport._sock, self.node = socket.socketpair()
+
+    def tearDown(self):
+        self.transport._sock.close()
+        self.node.close()
+
+    def read(self, *writes):
+        messages = []
+        reader = threading.Thread(target=lambda: messages.extend(self.transport._messages()))
+        reader.start()
+        for data in writes:
+            self.node.sendall(data)
+            time.sleep(0.01)
+        self.node.shutdown(socket.SHUT_WR)
+        reader.join()
+        return messages
+
+    def test_back_to_back(self):
+        self.assertEqual(self.read('{"id": 1}{"id": 2}\n[{"id": 3}]'), [{'id': 1}, {'id': 2}, [{'id': 3}]])
+
+    def test_split(self):
+        message = json.dumps({'id': 1, 'result': {'logs': [{'data': '0x' + 'ab' * 100}]}})
+        writes = [message[i:i + 7] for i in range(0, len(message), 7)]
+        self.assertEqual(self.read(*writes), [json.loads(message)])
+
+    def test_braces_in_strings(self):
+        self.assertEqual(self.read('{"id": 1, "result": "}{"}', '{"id": 2}'),
+                         [{'id': 1, 'result': '}{'}, {'id': 2}])
+
+
+if __name__ == '__main__':
+    unittest.main()